@@ -0,0 +1,45 @@
+import os
+import re
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from services.screenshot_service import SCREENSHOT_DIR, safe_name, screenshot_dir
+
+
+router = APIRouter()
+
+SCREENSHOT_FILE = re.compile(r"violation_(\d+)\.jpg$")
+
+
+@router.get("/sessions/{session_id}/screenshots")
+def list_screenshots(session_id: str):
+    """Evidence screenshots of a session, per student in violation order"""
+    session_dir = os.path.join(SCREENSHOT_DIR, f"session_{safe_name(session_id)}")
+    if not os.path.isdir(session_dir):
+        return []
+
+    screenshots = []
+    for student_dir in sorted(os.listdir(session_dir)):
+        if not student_dir.startswith("student_"):
+            continue
+        student_id = student_dir[len("student_"):]
+        files = [name for name in os.listdir(os.path.join(session_dir, student_dir)) if SCREENSHOT_FILE.match(name)]
+        for name in sorted(files, key=lambda name: int(SCREENSHOT_FILE.match(name).group(1))):
+            screenshots.append({
+                "student_id": student_id,
+                "file": name,
+                "url": f"/sessions/{session_id}/screenshots/{student_id}/{name}"
+            })
+    return screenshots
+
+
+@router.get("/sessions/{session_id}/screenshots/{student_id}/{filename}")
+def download_screenshot(session_id: str, student_id: str, filename: str):
+    # Only names the ScreenshotService writes, nothing outside the screenshot directory
+    if not SCREENSHOT_FILE.match(filename):
+        raise HTTPException(status_code=404, detail="screenshot not found")
+    path = os.path.join(screenshot_dir(SCREENSHOT_DIR, session_id, student_id), filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="screenshot not found")
+    return FileResponse(path, media_type="image/jpeg", filename=filename)
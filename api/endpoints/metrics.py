@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from pipeline.metrics import registry
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Frame, detector and stage timings of the detection pipelines in this process.
+
+    With DETECTION_WORKERS set, detection runs in the worker processes; they
+    send their timings back about once a second and they are merged in here.
+    """
+    return PlainTextResponse(registry.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/json")
+def metrics_snapshot():
+    return registry.snapshot()
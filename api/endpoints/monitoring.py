@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from api.endpoints.violations import record_events
+from detectors.model_registry import prewarm
+from services.detection_service import CapacityError, SessionManager
+from services.screenshot_service import SCREENSHOT_DIR
+from services.worker_pool import InferenceWorkerPool
+
+
+router = APIRouter()
+
+# Frames waiting per connection, the oldest is dropped when a student sends faster than we detect
+MAX_PENDING_FRAMES = 2
+
+# Inference processes, 0 = run detection in this process on the SessionManager's round robin loop
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "0"))
+
+# Load and warm up the models at startup instead of on the first student's frames, 0 = on first use
+PREWARM_MODELS = os.getenv("PREWARM_MODELS", "1") != "0"
+
+# Inference backend of the ObjectDetector: ultralytics (default), onnxruntime or openvino with an exported model
+OBJECT_DETECTOR_KWARGS = {
+    "backend": os.getenv("OBJECT_BACKEND", "ultralytics"),
+    "model_path": os.getenv("OBJECT_MODEL") or None,
+    "threads": int(os.getenv("OBJECT_THREADS", "0")) or None,
+}
+
+# Gaze baselines of students, reused when they reconnect
+BASELINE_PATH = os.getenv("GAZE_BASELINES", os.path.join("storage", "gaze_baselines.db"))
+# Background recalibration during long exams, drift below GazeDetector's 2 px direction threshold
+CALIBRATION_KWARGS = {"recalibrate_every": 300, "drift_threshold": 1.0}
+
+# Decoding never runs on the event loop
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="monitoring")
+session_manager = None
+worker_pool = None
+
+
+def get_session_manager():
+    """Shared SessionManager, created on first use so importing the app stays cheap.
+
+    Its background loop processes the sessions' frames round robin, with the
+    YOLO passes of a round batched together.
+    """
+    global session_manager
+    if session_manager is None:
+        session_manager = SessionManager(screenshot_dir=SCREENSHOT_DIR, baseline_path=BASELINE_PATH,
+                                         calibration_kwargs=CALIBRATION_KWARGS,
+                                         object_detector_kwargs=OBJECT_DETECTOR_KWARGS).start()
+    return session_manager
+
+
+def get_worker_pool():
+    """Shared InferenceWorkerPool when DETECTION_WORKERS is set, None otherwise"""
+    global worker_pool
+    if worker_pool is None and DETECTION_WORKERS > 0:
+        worker_pool = InferenceWorkerPool(
+            num_workers=DETECTION_WORKERS,
+            manager_kwargs={
+                "screenshot_dir": SCREENSHOT_DIR,
+                "baseline_path": BASELINE_PATH,
+                "calibration_kwargs": CALIBRATION_KWARGS,
+                "object_detector_kwargs": OBJECT_DETECTOR_KWARGS
+            }
+        )
+    return worker_pool
+
+
+def startup():
+    if not PREWARM_MODELS:
+        return
+    # The inference workers warm up their own models
+    if get_worker_pool() is None:
+        get_session_manager()
+        prewarm(object_detector_kwargs=OBJECT_DETECTOR_KWARGS)
+
+
+def decode_frame(data):
+    """Decode a JPEG / WebP message into a BGR frame, None if it is not an image"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def to_json(payload):
+    # numpy scalars (angles, confidences) are not JSON serializable on their own
+    return json.dumps(payload, default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
+
+
+@router.websocket("/ws/monitor/{session_id}")
+async def monitor(websocket: WebSocket, session_id: str, student_id: str = None):
+    """Students stream compressed frames (binary JPEG/WebP messages) and get detector results back"""
+    # Accepted first: a close before accept() is turned into an HTTP 403 and the client never sees the reason
+    await websocket.accept()
+    pool = get_worker_pool()
+    manager = None
+    try:
+        if pool is None:
+            manager = get_session_manager()
+            manager.open_session(session_id, student_id=student_id)
+        else:
+            # The session's worker checks its own capacity (and the pool that the worker is running)
+            await asyncio.wrap_future(pool.open_session(session_id, student_id=student_id))
+    except CapacityError as e:
+        await websocket.close(code=1013, reason=str(e))  # 1013 = try again later
+        return
+
+    queue = asyncio.Queue(maxsize=MAX_PENDING_FRAMES)
+    stats = {"received": 0, "dropped": 0}
+
+    async def receive_frames():
+        while True:
+            data = await websocket.receive_bytes()
+            stats["received"] += 1
+            if queue.full():
+                # Backpressure: keep the freshest frames only
+                queue.get_nowait()
+                stats["dropped"] += 1
+            queue.put_nowait((data, time.time()))
+
+    async def process_frames():
+        loop = asyncio.get_running_loop()
+        while True:
+            data, timestamp = await queue.get()
+            frame = await loop.run_in_executor(executor, decode_frame, data)
+            if frame is None:
+                results, events = {"error": "could not decode frame"}, []
+            else:
+                if pool is None:
+                    # Runs in the next round of the manager's loop, batched with the other sessions
+                    future = manager.submit(session_id, frame, timestamp)
+                else:
+                    # Copied into the worker's shared memory slot, detection runs in that process
+                    future = pool.submit(session_id, frame, timestamp)
+                # Shielded: cancelling this task on disconnect must not cancel a frame that is being processed
+                outcome = await asyncio.shield(asyncio.wrap_future(future)) if future is not None else None
+                if outcome is None:
+                    stats["dropped"] += 1
+                    continue
+                results, events = outcome
+            # Stored by the write-behind writer, only when a violation starts or ends
+            record_events(events)
+            await websocket.send_text(to_json({
+                "session_id": session_id,
+                "timestamp": timestamp,
+                "results": results,
+                "events": events,
+                "received_frames": stats["received"],
+                "dropped_frames": stats["dropped"]
+            }))
+
+    receiver = asyncio.create_task(receive_frames())
+    processor = asyncio.create_task(process_frames())
+    try:
+        done, _ = await asyncio.wait({receiver, processor}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        receiver.cancel()
+        processor.cancel()
+        if pool is None:
+            session = manager.close_session(session_id)
+            if session is not None:
+                record_events(session.last_events)
+        else:
+            pool.close_session(session_id).add_done_callback(lambda future: record_events(future.result()))
+
+
+def shutdown():
+    executor.shutdown(wait=False, cancel_futures=True)
+    if session_manager is not None:
+        session_manager.stop()
+    if worker_pool is not None:
+        worker_pool.close()
@@ -0,0 +1,51 @@
+import os
+
+from fastapi import APIRouter, HTTPException
+
+from models.violation import BufferedViolationWriter, SQLiteViolationStore
+
+
+router = APIRouter()
+
+VIOLATIONS_DB = os.getenv("VIOLATIONS_DB", os.path.join("storage", "violations.db"))
+
+violation_writer = None
+
+
+def get_violation_writer():
+    """Shared write-behind writer, created on first use so importing the app stays cheap"""
+    global violation_writer
+    if violation_writer is None:
+        violation_writer = BufferedViolationWriter(SQLiteViolationStore(VIOLATIONS_DB))
+    return violation_writer
+
+
+def record_events(events):
+    """Queue violation events for storage, never blocks on the database"""
+    if events:
+        get_violation_writer().extend(events)
+
+
+# Plain def endpoints: FastAPI runs them on its thread pool, the query never blocks the event loop
+
+@router.get("/violations")
+def list_violations(session_id: str = None, student_id: str = None, since: float = None, limit: int = 1000):
+    if session_id is None and student_id is None:
+        raise HTTPException(status_code=400, detail="session_id or student_id is required")
+    return get_violation_writer().store.query(session_id=session_id, student_id=student_id, since=since, limit=limit)
+
+
+@router.get("/sessions/{session_id}/violations")
+def session_violations(session_id: str, since: float = None, limit: int = 1000):
+    return get_violation_writer().store.query(session_id=session_id, since=since, limit=limit)
+
+
+@router.get("/students/{student_id}/violations")
+def student_violations(student_id: str, since: float = None, limit: int = 1000):
+    return get_violation_writer().store.query(student_id=student_id, since=since, limit=limit)
+
+
+def shutdown():
+    # Flush what is still buffered before the process exits
+    if violation_writer is not None:
+        violation_writer.close()
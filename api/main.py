@@ -3,6 +3,7 @@ from pydantic import BaseModel , EmailStr
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from starlette.middleware.sessions import SessionMiddleware
+from api.endpoints import downloads, metrics, monitoring, violations
 import os
 import secrets
 
@@ -17,6 +18,14 @@ app = FastAPI()
 
 app.mount("/static", StaticFiles(directory=r"..\frontend"), name="static")
 app.add_middleware(SessionMiddleware,secrets =secrets.token_urlsafe())
+app.include_router(monitoring.router)
+app.include_router(violations.router)
+app.include_router(downloads.router)
+app.include_router(metrics.router)
+app.add_event_handler("startup", monitoring.startup)
+app.add_event_handler("shutdown", monitoring.shutdown)
+# after monitoring, so the violations ended by closing sessions are flushed too
+app.add_event_handler("shutdown", violations.shutdown)
 
 
 
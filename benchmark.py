@@ -0,0 +1,305 @@
+"""Offline benchmark of the detectors and the DetectionPipeline.
+
+Unlike profile_run.py this needs no camera: frames come from a recorded
+video, a directory of images or a deterministic synthetic generator, so
+runs can be repeated in CI and compared between builds.
+
+    python benchmark.py --source exam.mp4 --frames 300 --output bench.json
+    python benchmark.py --synthetic --size 1280x720 --baseline bench.json
+    python benchmark.py --stages yolo,pipeline --object-backend onnxruntime --object-model yolo11n.onnx
+
+Every stage is timed on its own: face_mesh (LandmarkStage), yolo (the model
+call of the selected ObjectDetector backend, letterboxing and NMS
+included), object_postprocess (box filtering + alert timers), head_pose and
+gaze (on precomputed landmarks) and the full pipeline. Synthetic frames
+contain no face, use a recording for realistic face mesh / head pose numbers.
+Run it once per --object-backend to compare the backends on the same frames.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detectors.yolo_backends import BACKENDS
+from pipeline.capture import open_source
+from pipeline.frame_context import FrameContext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGES = ("face_mesh", "yolo", "object_postprocess", "head_pose", "gaze", "pipeline", "pipeline_parallel")
+
+
+class SyntheticSource:
+    """Deterministic moving pattern with noise, frame source protocol of pipeline.capture"""
+
+    def __init__(self, count, width=640, height=480, fps=30, seed=0):
+        self.count = count
+        self.fps = fps
+        self.position = 0
+        rng = np.random.default_rng(seed)
+        self.noise = rng.integers(0, 32, (height, width, 3), dtype=np.uint8)
+        self.gradient = np.tile(np.linspace(0, 192, width, dtype=np.uint8), (height, 1))
+
+    def read(self):
+        if self.position >= self.count:
+            return False, None, None
+        shift = (self.position * 8) % self.gradient.shape[1]
+        frame = np.roll(self.gradient, shift, axis=1)[:, :, None] + self.noise
+        timestamp = self.position / self.fps
+        self.position += 1
+        return True, frame, timestamp
+
+    def release(self):
+        self.position = self.count
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, None where it can't be read"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def summarize(latencies, wall_seconds, cpu_seconds):
+    latencies = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "frames": int(latencies.size),
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(latencies.max()),
+        "fps": float(latencies.size / wall_seconds) if wall_seconds > 0 else None,
+        "cpu_seconds": cpu_seconds,
+        # above 100 when the stage uses more than one core
+        "cpu_percent": 100.0 * cpu_seconds / wall_seconds if wall_seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def time_stage(frames, setup, step, warmup):
+    """Run step(state, frame, index, timestamp) over all frames, the first warmup frames are not measured"""
+    state = setup()
+    latencies = []
+    wall = cpu = 0.0
+    for index, (frame, timestamp) in enumerate(frames()):
+        if index < warmup:
+            step(state, frame, index, timestamp)
+            continue
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        step(state, frame, index, timestamp)
+        elapsed = time.perf_counter() - start
+        cpu += time.process_time() - cpu_start
+        wall += elapsed
+        latencies.append(elapsed)
+    close = getattr(state, "close", None)
+    if close is not None:
+        close()
+    if not latencies:
+        raise ValueError(f"no frames left after {warmup} warm-up frames")
+    return summarize(latencies, wall, cpu)
+
+
+def precompute_landmarks(frames):
+    """Landmarks of every frame, so head pose / gaze are timed without face mesh"""
+    from detectors.landmarks import LandmarkStage
+    from detectors.roi import FaceRoiTracker
+
+    stage = LandmarkStage(roi_tracker=FaceRoiTracker())
+    return [stage.process(frame) for frame, _ in frames()]
+
+
+def build_stages(frames, object_detector_kwargs=None):
+    """Stage name -> (setup, step), heavy imports only happen for the selected stages"""
+    object_detector_kwargs = object_detector_kwargs or {}
+
+    def face_mesh():
+        from detectors.landmarks import LandmarkStage
+        from detectors.roi import FaceRoiTracker
+        return LandmarkStage(roi_tracker=FaceRoiTracker())
+
+    def object_detector():
+        from detectors.object_detector import ObjectDetector
+        return ObjectDetector(**object_detector_kwargs)
+
+    def yolo(detector, frame, index, timestamp):
+        detector.backend.predict([frame], detector.model_classes, detector.model_conf)
+
+    def object_postprocess_setup():
+        # Model outputs are computed up front (boxes only, not the frames), only the post-processing is timed
+        detector = object_detector()
+        outputs = [
+            detector.backend.predict([frame], detector.model_classes, detector.model_conf)[0]
+            for frame, _ in frames()
+        ]
+        return detector, outputs
+
+    def object_postprocess(state, frame, index, timestamp):
+        detector, outputs = state
+        detector._build_result(frame, outputs[index])
+
+    def with_landmarks(load_class):
+        def setup():
+            return load_class()(), precompute_landmarks(frames)
+        return setup
+
+    def detect_with_landmarks(state, frame, index, timestamp):
+        detector, landmarks = state
+        context = FrameContext(frame, index, timestamp)
+        context.landmarks = landmarks[index]
+        context.landmarks_computed = True
+        detector.detect(frame, context)
+
+    def pipeline(parallel):
+        def setup():
+            from detectors.face_detector import FaceDetector
+            from detectors.gaze_detector import GazeDetector
+            from detectors.landmarks import LandmarkStage
+            from detectors.object_detector import ObjectDetector
+            from detectors.roi import FaceRoiTracker
+            from pipeline.detection_pipeline import DetectionPipeline
+
+            return DetectionPipeline(
+                detectors=[FaceDetector(), ObjectDetector(**object_detector_kwargs), GazeDetector()],
+                landmark_stage=LandmarkStage(roi_tracker=FaceRoiTracker()),
+                parallel=parallel
+            )
+        return setup
+
+    def face_detector():
+        from detectors.face_detector import FaceDetector
+        return FaceDetector
+
+    def gaze_detector():
+        from detectors.gaze_detector import GazeDetector
+        return GazeDetector
+
+    return {
+        "face_mesh": (face_mesh, lambda stage, frame, index, timestamp: stage.process(frame)),
+        "yolo": (object_detector, yolo),
+        "object_postprocess": (object_postprocess_setup, object_postprocess),
+        "head_pose": (with_landmarks(face_detector), detect_with_landmarks),
+        "gaze": (with_landmarks(gaze_detector), detect_with_landmarks),
+        "pipeline": (pipeline(False), lambda p, frame, index, timestamp: p.run(frame, timestamp)),
+        "pipeline_parallel": (pipeline(True), lambda p, frame, index, timestamp: p.run(frame, timestamp)),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print p95 changes against a previous run, returns the stages that got slower than tolerance"""
+    regressions = []
+    for name, stats in results["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in stats:
+            continue
+        change = stats["p95_ms"] / before["p95_ms"] - 1.0 if before["p95_ms"] > 0 else 0.0
+        print(f"{name:20s} p95 {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="video file or image directory")
+    parser.add_argument("--synthetic", action="store_true", help="use generated frames (default without --source)")
+    parser.add_argument("--size", default="640x480", help="synthetic frame size WxH")
+    parser.add_argument("--frames", type=int, default=200, help="frames per stage")
+    parser.add_argument("--warmup", type=int, default=10, help="frames run before measuring")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated subset of " + ", ".join(STAGES))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare p95 latencies with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed p95 slowdown against the baseline")
+    parser.add_argument("--object-backend", default="ultralytics", choices=BACKENDS,
+                        help="inference backend of the object detector")
+    parser.add_argument("--object-model", help="exported model of the onnxruntime / openvino backend")
+    parser.add_argument("--object-threads", type=int, help="intra-op threads of the object detector backend")
+    args = parser.parse_args(argv)
+    object_detector_kwargs = {"backend": args.object_backend, "model_path": args.object_model,
+                              "threads": args.object_threads}
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    total = args.frames + args.warmup
+
+    def frames():
+        # Every stage gets the same frames, read again so decoding is never timed
+        source = SyntheticSource(total, width, height) if args.source is None else open_source(args.source)
+        try:
+            for _ in range(total):
+                ret, frame, timestamp = source.read()
+                if not ret:
+                    break
+                yield frame, timestamp
+        finally:
+            source.release()
+
+    selected = [name.strip() for name in args.stages.split(",") if name.strip()]
+    unknown = set(selected) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    stages = build_stages(frames, object_detector_kwargs)
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "source": args.source or f"synthetic {width}x{height}",
+            "frames": args.frames,
+            "warmup": args.warmup,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "object_detector": object_detector_kwargs,
+        },
+        "stages": {}
+    }
+
+    for name in selected:
+        setup, step = stages[name]
+        print(f"Benchmarking {name} ...", file=sys.stderr)
+        try:
+            results["stages"][name] = time_stage(frames, setup, step, args.warmup)
+        except Exception as e:
+            # e.g. the YOLO weights are missing, the other stages still run
+            results["stages"][name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"  failed: {e}", file=sys.stderr)
+            continue
+        stats = results["stages"][name]
+        print(f"  p50 {stats['p50_ms']:.2f} ms  p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+              f"{stats['fps']:.1f} FPS  cpu {stats['cpu_percent']:.0f}%", file=sys.stderr)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
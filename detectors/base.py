@@ -1,7 +1,57 @@
 # abstract class
+import time
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
+
+from .landmarks import LandmarkStage
+
+# used when a detector runs without a pipeline, nothing is timed
+_NO_TIMING = nullcontext()
 
 class BaseDetector(ABC):
+    # True for detectors that read the shared face mesh results of the pipeline
+    uses_landmarks = False
+    # Run every N processed frames, the pipeline reuses the cached result in between
+    run_interval = 1
+    # Time source of the timer logic when a frame has no timestamp, detectors take clock= to replace it
+    clock = staticmethod(time.time)
+
     @abstractmethod
-    def detect (self , frame) -> dict:
-        pass 
\ No newline at end of file
+    def detect (self , frame, context=None) -> dict:
+        """context: optional FrameContext with data shared by the pipeline (e.g. face mesh results)"""
+        pass
+
+    def stage(self, context, name):
+        """Time a block as one stage of this detector: preprocess, inference, postprocess or state_update"""
+        if context is None:
+            return _NO_TIMING
+        return context.stage(type(self).__name__, name)
+
+    def frame_time(self, context):
+        """Timestamp of the frame for the duration logic, the detector's clock without a pipeline"""
+        if context is not None and context.timestamp is not None:
+            return context.timestamp
+        return self.clock()
+
+
+class LandmarkDetector(BaseDetector):
+    """Detector working on face mesh landmarks: the pipeline's shared ones, or its own when used standalone."""
+
+    uses_landmarks = True
+    # only created when no shared LandmarkStage result is passed in
+    landmark_stage = None
+
+    def get_landmarks(self, frame, context=None):
+        """Return the (N, 3) landmark array, reusing the pipeline's shared landmark stage if available"""
+        if context is not None and context.landmarks_computed:
+            return context.landmarks
+        _, landmarks = self.preprocess(frame)
+        return landmarks
+
+    def preprocess(self, frame):
+        # Standalone use: run our own landmark stage (color conversion in a reused
+        # buffer, landmarks mirrored for selfie view without flipping the pixels)
+        if self.landmark_stage is None:
+            self.landmark_stage = LandmarkStage()
+        landmarks = self.landmark_stage.process(frame)
+        return frame, landmarks
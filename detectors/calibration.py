@@ -0,0 +1,261 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStats:
+    """Welford's running mean / variance of 2D samples, constant memory."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = 0.0
+
+    def add(self, x, y):
+        self.count += 1
+        delta_x = x - self.mean_x
+        delta_y = y - self.mean_y
+        self.mean_x += delta_x / self.count
+        self.mean_y += delta_y / self.count
+        self.m2_x += delta_x * (x - self.mean_x)
+        self.m2_y += delta_y * (y - self.mean_y)
+
+    @property
+    def std_x(self):
+        return math.sqrt(self.m2_x / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def std_y(self):
+        return math.sqrt(self.m2_y / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class GazeCalibration:
+    """Baseline iris offset of a candidate looking at the screen.
+
+    The first `frames` samples give the initial baseline. Afterwards the
+    baseline can be refreshed in the background while detection keeps using
+    the old one:
+      - every recalibrate_every seconds, and
+      - when a slow moving average of the offset drifts more than
+        drift_threshold pixels away from the baseline (the candidate moved).
+    A refresh is only accepted when the gaze was steady (std <= max_std) and
+    the baseline moves at most max_shift pixels, so a candidate staring at
+    notes for a while is not mistaken for a new "forward". max_shift and
+    drift_threshold stay below GazeDetector's 2 px direction threshold: an
+    offset the detector reports as looking away can never become the baseline.
+    Frames fed with hold=True (the detector sees the candidate looking away)
+    move neither the drift average nor a refresh.
+    """
+
+    def __init__(self, frames=30, recalibrate_every=None, drift_threshold=None, drift_smoothing=0.02,
+                 max_std=1.5, max_shift=1.5, baseline=None, on_calibrated=None):
+        """
+        frames: samples averaged for a (re)calibration
+        recalibrate_every: seconds between background recalibrations, None = never
+        drift_threshold: pixels the smoothed offset may move before recalibrating, None = off
+        drift_smoothing: weight of a new sample in the drift moving average
+        max_std / max_shift: acceptance limits of a background recalibration (pixels)
+        baseline: saved baseline dict (see to_dict), skips the initial calibration
+        on_calibrated: optional callback(baseline dict) whenever a baseline is set
+        """
+        self.frames = frames
+        self.recalibrate_every = recalibrate_every
+        self.drift_threshold = drift_threshold
+        self.drift_smoothing = drift_smoothing
+        self.max_std = max_std
+        self.max_shift = max_shift
+        self.on_calibrated = on_calibrated
+
+        self.stats = RunningStats()
+        self.is_calibrated = False
+        self.recalibrating = False
+        self.baseline_x = 0.0
+        self.baseline_y = 0.0
+        self.baseline_std = (0.0, 0.0)
+        self.calibrated_at = None
+        self.drift_x = self.drift_y = 0.0
+        self.recalibrations = 0
+        self.rejected_recalibrations = 0
+        if baseline is not None:
+            self.load(baseline)
+
+    def update(self, x, y, timestamp=None, hold=False):
+        """Feed the raw iris offset of a frame, returns True when the baseline changed.
+
+        hold: the candidate is looking away, the frame is kept out of the background recalibration
+        """
+        if not self.is_calibrated:
+            self.stats.add(x, y)
+            if self.stats.count >= self.frames:
+                self._set_baseline(timestamp)
+                logger.info("Calibration complete! Baseline: X=%.2f, Y=%.2f", self.baseline_x, self.baseline_y)
+                return True
+            return False
+
+        if hold:
+            # a refresh that already started begins again once the gaze is back
+            if self.recalibrating:
+                self.stats.reset()
+            return False
+
+        if self.recalibrating:
+            self.stats.add(x, y)
+            if self.stats.count >= self.frames:
+                return self._finish_recalibration(timestamp)
+            return False
+
+        if self.calibrated_at is None:
+            self.calibrated_at = timestamp
+        # Slow moving average, only a lasting shift gets past drift_threshold
+        self.drift_x += self.drift_smoothing * (x - self.drift_x)
+        self.drift_y += self.drift_smoothing * (y - self.drift_y)
+        drifted = (self.drift_threshold is not None and
+                   math.hypot(self.drift_x - self.baseline_x, self.drift_y - self.baseline_y) > self.drift_threshold)
+        due = (self.recalibrate_every is not None and timestamp is not None and self.calibrated_at is not None and
+               timestamp - self.calibrated_at >= self.recalibrate_every)
+        if drifted or due:
+            self.recalibrating = True
+            self.stats.reset()
+        return False
+
+    def _finish_recalibration(self, timestamp):
+        self.recalibrating = False
+        steady = self.stats.std_x <= self.max_std and self.stats.std_y <= self.max_std
+        shift = math.hypot(self.stats.mean_x - self.baseline_x, self.stats.mean_y - self.baseline_y)
+        if steady and shift <= self.max_shift:
+            self.recalibrations += 1
+            self._set_baseline(timestamp)
+            logger.info("Recalibrated, baseline moved %.2f px", shift)
+            return True
+
+        self.rejected_recalibrations += 1
+        # try again after another interval, the drift average starts over from the baseline
+        self.calibrated_at = timestamp
+        self.drift_x, self.drift_y = self.baseline_x, self.baseline_y
+        self.stats.reset()
+        return False
+
+    def _set_baseline(self, timestamp):
+        self.baseline_x, self.baseline_y = self.stats.mean_x, self.stats.mean_y
+        self.baseline_std = (self.stats.std_x, self.stats.std_y)
+        self.drift_x, self.drift_y = self.baseline_x, self.baseline_y
+        self.calibrated_at = timestamp
+        self.is_calibrated = True
+        self.stats.reset()
+        if self.on_calibrated is not None:
+            self.on_calibrated(self.to_dict())
+
+    def to_dict(self):
+        return {
+            "baseline_x": self.baseline_x,
+            "baseline_y": self.baseline_y,
+            "std_x": self.baseline_std[0],
+            "std_y": self.baseline_std[1],
+            "calibrated_at": self.calibrated_at,
+        }
+
+    def load(self, baseline):
+        """Start from a saved baseline, e.g. of a reconnecting candidate"""
+        self.baseline_x = float(baseline["baseline_x"])
+        self.baseline_y = float(baseline["baseline_y"])
+        self.baseline_std = (float(baseline.get("std_x", 0.0)), float(baseline.get("std_y", 0.0)))
+        self.drift_x, self.drift_y = self.baseline_x, self.baseline_y
+        # the interval of periodic recalibration starts with the first frame
+        self.calibrated_at = None
+        self.is_calibrated = True
+        self.recalibrating = False
+        self.stats.reset()
+
+    def reset(self):
+        """Forget the baseline, the next frames calibrate from scratch"""
+        self.is_calibrated = False
+        self.recalibrating = False
+        self.stats.reset()
+
+
+class SQLiteBaselineStore:
+    """Gaze baselines per student, one row each in a SQLite database (WAL mode).
+
+    Every put() replaces one student's row in its own transaction, so several
+    processes (e.g. inference workers) can share the database without losing
+    each other's students, and get() always sees the latest committed row.
+    put() only queues the baseline: a background thread writes it, the
+    detection loop never waits for the disk.
+    """
+
+    def __init__(self, path=os.path.join("storage", "gaze_baselines.db")):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # shared by the writer thread and the sessions being opened
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS gaze_baselines (student_id TEXT PRIMARY KEY, baseline TEXT NOT NULL)")
+
+        # student id -> latest baseline not written yet, a newer one replaces it
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="baseline-writer", daemon=True)
+        self.thread.start()
+
+    def get(self, student_id):
+        student_id = str(student_id)
+        with self.condition:
+            if student_id in self.pending:
+                return self.pending[student_id]
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT baseline FROM gaze_baselines WHERE student_id = ?", (student_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, student_id, baseline):
+        with self.condition:
+            self.pending[str(student_id)] = baseline
+            self.condition.notify()
+
+    def flush(self):
+        """Write the queued baselines, on the calling thread"""
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO gaze_baselines (student_id, baseline) VALUES (?, ?)",
+                    [(student_id, json.dumps(baseline)) for student_id, baseline in pending.items()]
+                )
+        except Exception:
+            # the students calibrate again next time, detection goes on
+            logger.exception("Could not save %d gaze baselines", len(pending))
+
+    def _loop(self):
+        while self.running:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.running or self.pending)
+            self.flush()
+
+    def close(self):
+        """Stop the writer thread, write what is queued and close the database"""
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join(timeout=5)
+        self.flush()
+        with self.lock:
+            self.connection.close()
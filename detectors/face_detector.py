@@ -1,24 +1,26 @@
-from .base import BaseDetector
-import cv2
-import mediapipe as mp
+from .base import LandmarkDetector
+from .head_pose import HeadPoseTracker
 import numpy as np
-import time
+import logging
 
 
-class FaceDetector(BaseDetector):
+logger = logging.getLogger(__name__)
+
+
+class FaceDetector(LandmarkDetector):
 
     """Face detector for cheating behavior detection based on head pose estimation."""
 
-    # class attributes
-    mp_face_mesh = mp.solutions.face_mesh
-    mp_drawing = mp.solutions.drawing_utils
-    # Important facial landmarks for pose estimation
-    IMPORTANT_LANDMARKS = {33, 263, 1, 61, 291, 199}  # Eyes, nose, mouth corners, chin
+    # Important facial landmarks for pose estimation, in landmark order
+    IMPORTANT_LANDMARKS = np.array([1, 33, 61, 199, 263, 291])  # Nose, eyes, mouth corners, chin
 
     # constructor 
-    def __init__(self):  
-        self.face_mesh = self.mp_face_mesh.FaceMesh(min_detection_confidence=0.5, min_tracking_confidence=0.5,refine_landmarks=True)
-        self.drawing_spec = self.mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
+    def __init__(self, clock=None):  
+        # clock: callable returning seconds, for the timer logic outside a pipeline (default time.time)
+        if clock is not None:
+            self.clock = clock
+        # cached intrinsics + warm started solvePnP across frames
+        self.pose_tracker = HeadPoseTracker()
         self.cheating_start_time = None
         self.cheating_end_time = None
         self.cheating_count = 0
@@ -29,100 +31,50 @@ class FaceDetector(BaseDetector):
         self.cheating_status = False
 
     # detection method
-    def detect( self, frame) -> dict:
-        image,results = self.preprocess(frame)
-        pitch,yaw,roll = self.get_head_pose(results,image)
-        print(f"Pitch : {pitch} Yaw : {yaw} Roll : {roll}")
+    def detect( self, frame, context=None) -> dict:
+        with self.stage(context, "preprocess"):
+            landmarks = self.get_landmarks(frame, context)
+        with self.stage(context, "inference"):
+            pitch,yaw,roll = self.get_head_pose(landmarks,frame)
+        logger.debug("Pitch : %s Yaw : %s Roll : %s", pitch, yaw, roll)
         
         if pitch is None or yaw is None or roll is None:
             return {
-                "cheating": False,
-                "direction": None,
+                # No face this frame: unknown, the state (and an ongoing violation) is kept
+                "cheating": self.cheating,
+                "direction": self.cheating_direction,
+                "cheating_start_time": self.cheating_start_time,
                 "cheating_count": self.cheating_count,
                 "cheating_duration": self.cheating_duration,
                 "cheating_duration_total": self.cheating_duration_total 
             }
-        directions = self.check_cheating_behavior(pitch,yaw,roll) 
-        cheating_status , direction , duration  ,count,_= self.update_cheating_count(directions)  
+        with self.stage(context, "postprocess"):
+            directions = self.check_cheating_behavior(pitch,yaw,roll) 
+        with self.stage(context, "state_update"):
+            cheating_status , direction , duration  ,count,_= self.update_cheating_count(directions, self.frame_time(context))  
         return {
             "cheating": cheating_status,
             "direction": direction,
+            "cheating_start_time": self.cheating_start_time,
             "cheating_count": count,
             "cheating_duration": duration,
             "cheating_duration_total": self.cheating_duration_total 
         }
 
-    def preprocess(self,frame):
-        # Flip the image horizontally for a later selfie-view display
-        # Also convert the color space from BGR to RGB for mediapipe
-        image = cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB)
-
-        # To improve performance
-        image.flags.writeable = False
-    
-        # Get the result
-        results = self.face_mesh.process(image)
-    
-        # To improve performance
-        image.flags.writeable = True
-    
-        # Convert the color space from RGB to BGR for Open cv conversion
-        cv_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        return cv_image,results
-
-
-    def get_head_pose (self,results,image):
-        # extract the landmarks of face
-        img_h, img_w, _ = image.shape
-        face_2d = []
-        face_3d = []
-        
-
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                for idx, lm in enumerate(face_landmarks.landmark):
-                    important_landmarks = {33, 263, 1, 61, 291, 199}
-                    if idx in important_landmarks:
-                        x, y = int(lm.x * img_w), int(lm.y * img_h)
-                        face_2d.append([x, y])
-                        face_3d.append([x, y, lm.z ])        
-            if len(face_2d) < 6 :
-                return None, None, None
-
-            # Convert it to the NumPy array
-            face_2d = np.array(face_2d, dtype=np.float64)
-
-            # Convert it to the NumPy array
-            face_3d = np.array(face_3d, dtype=np.float64)
-
-            # The camera matrix
-            focal_length = 1 * img_w
-            cam_matrix = np.array([ [focal_length, 0, img_h / 2],
-                                    [0, focal_length, img_w / 2],
-                                    [0, 0, 1]])
-
-            # The distortion parameters
-            dist_matrix = np.zeros((4, 1), dtype=np.float64)
-
-            # Solve PnP
-            success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
-            if not success:
-                return None, None, None
-
-            # Get rotational matrix
-            rmat, _ = cv2.Rodrigues(rot_vec)
 
-            # Get angles
-            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+    def get_head_pose (self,landmarks,image):
+        # landmarks: (N, 3) array of normalized landmarks, None when no face was found
+        img_h, img_w = image.shape[:2]
 
-            # Get the y rotation degree
-            x_angles = angles[0] * 360
-            y_angles = angles[1] * 360
-            z_angles = angles[2] * 360
+        if landmarks is not None:
+            # Pick the 6 pose landmarks at once, pixel coordinates truncated like before
+            points = landmarks[self.IMPORTANT_LANDMARKS]
+            face_2d = (points[:, :2] * (img_w, img_h)).astype(np.int64).astype(np.float64)
+            face_3d = np.column_stack((face_2d, points[:, 2]))
 
-            pitch, yaw, roll = x_angles, y_angles, z_angles
-            return pitch, yaw, roll
+            return self.pose_tracker.estimate(face_2d, face_3d, img_w, img_h)
 
+        self.pose_tracker.reset()
         return None, None, None
 
     def check_cheating_behavior(self,pitch,yaw,roll):
@@ -139,8 +91,10 @@ class FaceDetector(BaseDetector):
         return direction 
 
 
-    def update_cheating_count(self , directions):
-        current_time = time.time()
+    def update_cheating_count(self , directions, current_time=None):
+        # current_time: frame timestamp (media time for recordings), the detector's clock by default
+        if current_time is None:
+            current_time = self.clock()
         
         # Cheating logic
         if directions != "Forward":
@@ -1,42 +1,41 @@
-from .base import BaseDetector
-import cv2
-import mediapipe as mp
-import time
+from .base import LandmarkDetector
+from .calibration import GazeCalibration
+import numpy as np
+import logging
 from collections import deque
 
 
-class GazeDetector(BaseDetector):
+logger = logging.getLogger(__name__)
+
+
+class GazeDetector(LandmarkDetector):
     """Gaze detector for cheating behavior detection based on iris tracking."""
     
-    # Class attributes
-    mp_face_mesh = mp.solutions.face_mesh
-    mp_drawing = mp.solutions.drawing_utils
-    mp_drawing_styles = mp.solutions.drawing_styles
+    # Iris and eye landmark indices (index arrays for picking rows of the landmark array)
+    LEFT_IRIS = np.array([474, 475, 476, 477])
+    RIGHT_IRIS = np.array([469, 470, 471, 472])
+    LEFT_EYE = np.array([33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246])
+    RIGHT_EYE = np.array([362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398])
+    # All four groups gathered in one go: left iris, right iris, left eye, right eye
+    CENTER_INDICES = np.concatenate([LEFT_IRIS, RIGHT_IRIS, LEFT_EYE, RIGHT_EYE])
+    CENTER_STARTS = np.cumsum([0, len(LEFT_IRIS), len(RIGHT_IRIS), len(LEFT_EYE)])
+    CENTER_SIZES = np.array([len(LEFT_IRIS), len(RIGHT_IRIS), len(LEFT_EYE), len(RIGHT_EYE)])[:, None]
     
-    # Iris and eye landmark indices
-    LEFT_IRIS = [474, 475, 476, 477]
-    RIGHT_IRIS = [469, 470, 471, 472]
-    LEFT_EYE = [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246]
-    RIGHT_EYE = [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
-    
-    def __init__(self):
-        """Initialize the GazeDetector."""
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.drawing_spec = self.mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
-        
-        # Calibration variables
-        self.calibration_data = []
-        self.is_calibrated = False
-        self.baseline_x = 0
-        self.baseline_y = 0
-        
-        # Smoothing
+    def __init__(self, clock=None, calibration=None):
+        """Initialize the GazeDetector.
+
+        clock: callable returning seconds, for the timer logic outside a pipeline (default time.time)
+        calibration: GazeCalibration to use, e.g. with a saved baseline or recalibration settings
+        """
+        if clock is not None:
+            self.clock = clock
+        # Calibration: running statistics, constant memory
+        self.calibration = calibration or GazeCalibration()
+        
+        # Smoothing, the running sums of gaze_history make the average O(1)
         self.gaze_history = deque(maxlen=5)
+        self.gaze_sum_x = 0.0
+        self.gaze_sum_y = 0.0
         
         # Cheating detection variables (matching FaceDetector pattern)
         self.cheating_start_time = None
@@ -49,186 +48,152 @@ class GazeDetector(BaseDetector):
         self.cheating_status = False
         
         # Thresholds
+        # pixels of smoothed iris offset from the baseline that count as looking away
+        self.DIRECTION_THRESHOLD = 2
         self.NORMAL_THRESHOLD = 3
         self.SUSPICIOUS_THRESHOLD = 6
         self.CHEATING_THRESHOLD = 10
     
-    def detect(self, frame) -> dict:
+    def detect(self, frame, context=None) -> dict:
         """Main detection method following FaceDetector pattern."""
-        image, results = self.preprocess(frame)
-        diff_x, diff_y = self.get_gaze_direction(results, image)
+        with self.stage(context, "preprocess"):
+            landmarks = self.get_landmarks(frame, context)
+        with self.stage(context, "inference"):
+            diff_x, diff_y = self.get_gaze_direction(landmarks, frame, self.frame_time(context))
         
         if diff_x is None or diff_y is None:
-            print("No face detected")
+            logger.debug("No face detected")
             return {
-                "cheating": False,
-                "direction": None,
+                # No face this frame: unknown, the state (and an ongoing violation) is kept
+                "cheating": self.cheating,
+                "direction": self.cheating_direction,
+                "cheating_start_time": self.cheating_start_time,
                 "cheating_count": self.cheating_count,
                 "cheating_duration": self.cheating_duration,
                 "cheating_duration_total": self.cheating_duration_total
             }
         
-        print(f"Gaze - X: {diff_x:.1f}, Y: {diff_y:.1f}")
+        logger.debug("Gaze - X: %.1f, Y: %.1f", diff_x, diff_y)
         
-        direction = self.check_cheating_behavior(diff_x, diff_y)
-        cheating_status, direction, duration, count, _ = self.update_cheating_count(direction)
+        with self.stage(context, "postprocess"):
+            direction = self.check_cheating_behavior(diff_x, diff_y)
+        with self.stage(context, "state_update"):
+            cheating_status, direction, duration, count, _ = self.update_cheating_count(direction, self.frame_time(context))
         
         return {
             "cheating": cheating_status,
             "direction": direction,
+            "cheating_start_time": self.cheating_start_time,
             "cheating_count": count,
             "cheating_duration": duration,
             "cheating_duration_total": self.cheating_duration_total
         }
-    def preprocess(self, frame):
-        """Preprocess frame for gaze detection."""
-        # Flip the image horizontally for a later selfie-view display
-        # Also convert the color space from BGR to RGB for mediapipe
-        image = cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB)
-        
-        # To improve performance
-        image.flags.writeable = False
-        
-        # Get the result
-        results = self.face_mesh.process(image)
-        
-        # To improve performance
-        image.flags.writeable = True
-        
-        # Convert the color space from RGB to BGR for OpenCV
-        cv_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        return cv_image, results
-    
-    def get_eye_center(self, landmarks, eye_indices, img_w, img_h):
-        """Calculate the center of an eye region."""
-        x_coords = [landmarks[i].x * img_w for i in eye_indices]
-        y_coords = [landmarks[i].y * img_h for i in eye_indices]
-        center_x = sum(x_coords) / len(x_coords)
-        center_y = sum(y_coords) / len(y_coords)
-        return int(center_x), int(center_y)
+
+    def get_iris_offset(self, landmarks, img_w, img_h):
+        """Iris center minus eye center in pixels, averaged over both eyes, as (x, y)."""
+        # One gather and one reduction for the four centers instead of four separate means
+        centers = np.add.reduceat(landmarks[self.CENTER_INDICES, :2], self.CENTER_STARTS, axis=0) / self.CENTER_SIZES
+        left_iris, right_iris, left_eye, right_eye = centers
+        diff_x, diff_y = ((left_iris - left_eye) + (right_iris - right_eye)) * (img_w / 2, img_h / 2)
+        return float(diff_x), float(diff_y)
     
-    def get_iris_center(self, landmarks, iris_indices, img_w, img_h):
-        """Calculate the center of iris."""
-        x_coords = [landmarks[i].x * img_w for i in iris_indices]
-        y_coords = [landmarks[i].y * img_h for i in iris_indices]
-        center_x = sum(x_coords) / len(x_coords)
-        center_y = sum(y_coords) / len(y_coords)
-        return int(center_x), int(center_y)
+    @property
+    def is_calibrated(self):
+        return self.calibration.is_calibrated
+
+    @property
+    def baseline_x(self):
+        return self.calibration.baseline_x
+
+    @property
+    def baseline_y(self):
+        return self.calibration.baseline_y
+
+    def calibrate(self, landmarks, img_w, img_h, current_time=None):
+        """Feed a frame to the calibration, returns the raw iris offset."""
+        raw_diff_x, raw_diff_y = self.get_iris_offset(landmarks, img_w, img_h)
+        # While the candidate looks away the offset must not become the new "forward"
+        looking_away = self.cheating or self.cheating_start_time is not None
+        if self.calibration.update(raw_diff_x, raw_diff_y, current_time, hold=looking_away):
+            # Smoothed values relative to the old baseline are meaningless now
+            self.gaze_history.clear()
+            self.gaze_sum_x = self.gaze_sum_y = 0.0
+        return raw_diff_x, raw_diff_y
     
-    def calibrate(self, landmarks, img_w, img_h):
-        """Calibrate the system with forward-looking gaze."""
-        # Get eye and iris centers
-        left_eye_center = self.get_eye_center(landmarks, self.LEFT_EYE, img_w, img_h)
-        right_eye_center = self.get_eye_center(landmarks, self.RIGHT_EYE, img_w, img_h)
-        left_iris_center = self.get_iris_center(landmarks, self.LEFT_IRIS, img_w, img_h)
-        right_iris_center = self.get_iris_center(landmarks, self.RIGHT_IRIS, img_w, img_h)
-        
-        # Calculate differences
-        left_diff_x = left_iris_center[0] - left_eye_center[0]
-        left_diff_y = left_iris_center[1] - left_eye_center[1]
-        right_diff_x = right_iris_center[0] - right_eye_center[0]
-        right_diff_y = right_iris_center[1] - right_eye_center[1]
-        
-        # Average
-        avg_diff_x = (left_diff_x + right_diff_x) / 2
-        avg_diff_y = (left_diff_y + right_diff_y) / 2
-        
-        self.calibration_data.append((avg_diff_x, avg_diff_y))
-        
-        # If we have enough calibration data, calculate baseline
-        if len(self.calibration_data) >= 30:  # 30 frames for calibration
-            x_vals = [d[0] for d in self.calibration_data]
-            y_vals = [d[1] for d in self.calibration_data]
+    def get_gaze_direction(self, landmarks, image, current_time=None):
+        """Extract gaze direction from the (N, 3) landmark array, None when no face was found."""
+        img_h, img_w = image.shape[:2]
+        
+        if landmarks is not None:
+            # Calibration phase
+            if not self.is_calibrated:
+                self.calibrate(landmarks, img_w, img_h, current_time)
+                return 0, 0  # Return neutral during calibration
             
-            self.baseline_x = sum(x_vals) / len(x_vals)
-            self.baseline_y = sum(y_vals) / len(y_vals)
-            self.is_calibrated = True
+            # Iris offset of both eyes (also tracks drift / background recalibration), normalized with baseline
+            raw_diff_x, raw_diff_y = self.calibrate(landmarks, img_w, img_h, current_time)
             
-            print(f"Calibration complete! Baseline: X={self.baseline_x:.2f}, Y={self.baseline_y:.2f}")
-    
-    def get_gaze_direction(self, results, image):
-        """Extract gaze direction from face landmarks."""
-        img_h, img_w, _ = image.shape
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                landmarks = face_landmarks.landmark
-                
-                # Calibration phase
-                if not self.is_calibrated:
-                    self.calibrate(landmarks, img_w, img_h)
-                    return 0, 0  # Return neutral during calibration
-                
-                # Get eye and iris centers
-                left_eye_center = self.get_eye_center(landmarks, self.LEFT_EYE, img_w, img_h)
-                right_eye_center = self.get_eye_center(landmarks, self.RIGHT_EYE, img_w, img_h)
-                left_iris_center = self.get_iris_center(landmarks, self.LEFT_IRIS, img_w, img_h)
-                right_iris_center = self.get_iris_center(landmarks, self.RIGHT_IRIS, img_w, img_h)
-                
-                # Calculate differences
-                left_diff_x = left_iris_center[0] - left_eye_center[0]
-                left_diff_y = left_iris_center[1] - left_eye_center[1]
-                right_diff_x = right_iris_center[0] - right_eye_center[0]
-                right_diff_y = right_iris_center[1] - right_eye_center[1]
-                
-                # Average and normalize with baseline
-                raw_diff_x = (left_diff_x + right_diff_x) / 2
-                raw_diff_y = (left_diff_y + right_diff_y) / 2
-                
-                norm_diff_x = raw_diff_x - self.baseline_x
-                norm_diff_y = raw_diff_y - self.baseline_y
-                
-                # Smooth the values
-                self.gaze_history.append((norm_diff_x, norm_diff_y))
-                if len(self.gaze_history) > 1:
-                    avg_x = sum([g[0] for g in self.gaze_history]) / len(self.gaze_history)
-                    avg_y = sum([g[1] for g in self.gaze_history]) / len(self.gaze_history)
-                else:
-                    avg_x, avg_y = norm_diff_x, norm_diff_y
-                
-                return avg_x, avg_y
+            norm_diff_x = raw_diff_x - self.baseline_x
+            norm_diff_y = raw_diff_y - self.baseline_y
+            
+            # Smooth the values
+            return self.smooth(norm_diff_x, norm_diff_y)
         
         return None, None
     
+    def smooth(self, diff_x, diff_y):
+        """Moving average over gaze_history, kept as running sums instead of re-summing the deque."""
+        if len(self.gaze_history) == self.gaze_history.maxlen:
+            old_x, old_y = self.gaze_history[0]
+            self.gaze_sum_x -= old_x
+            self.gaze_sum_y -= old_y
+        self.gaze_history.append((diff_x, diff_y))
+        self.gaze_sum_x += diff_x
+        self.gaze_sum_y += diff_y
+        count = len(self.gaze_history)
+        return self.gaze_sum_x / count, self.gaze_sum_y / count
+    
     def check_cheating_behavior(self, diff_x, diff_y):
         """Check for suspicious gaze behavior."""
         abs_x = abs(diff_x)
         abs_y = abs(diff_y)
+        threshold = self.DIRECTION_THRESHOLD
         
         # Direction determination with smaller thresholds
-        if abs_x < 2 and abs_y < 2:
+        if abs_x < threshold and abs_y < threshold:
             return "Forward"
         
         # Determine primary direction
         if abs_x > abs_y:
-            if diff_x > 2:
+            if diff_x > threshold:
                 direction = "Right"
-            elif diff_x < -2:
+            elif diff_x < -threshold:
                 direction = "Left"
             else:
                 direction = "Center"
         else:
-            if diff_y > 2:
+            if diff_y > threshold:
                 direction = "Down"
-            elif diff_y < -2:
+            elif diff_y < -threshold:
                 direction = "Up"
             else:
                 direction = "Center"
         
         # Handle center cases
         if direction == "Center":
-            if abs_y > 2:
+            if abs_y > threshold:
                 direction = "Up" if diff_y < 0 else "Down"
-            elif abs_x > 2:
+            elif abs_x > threshold:
                 direction = "Left" if diff_x < 0 else "Right"
             else:
                 direction = "Forward"
         
         return direction
     
-    def update_cheating_count(self, direction):
+    def update_cheating_count(self, direction, current_time=None):
         """Update cheating count and duration (matching FaceDetector pattern)."""
-        current_time = time.time()
+        if current_time is None:
+            current_time = self.clock()
         
         # Cheating logic
         if direction != "Forward":
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+
+class HeadPoseTracker:
+    """Head pose from solvePnP with cached camera intrinsics and a warm start.
+
+    The previous rot_vec / trans_vec are fed back as an extrinsic guess, and
+    when none of the landmarks moved more than motion_threshold pixels the
+    previous angles are returned without solving again.
+    """
+
+    # (img_w, img_h) -> (cam_matrix, dist_matrix), shared by every tracker
+    intrinsics_cache = {}
+
+    def __init__(self, motion_threshold=1.0):
+        """motion_threshold: largest landmark movement (pixels) that still reuses the previous pose"""
+        self.motion_threshold = motion_threshold
+        self.reset()
+
+    @classmethod
+    def get_intrinsics(cls, img_w, img_h):
+        """Camera matrix and distortion parameters for a resolution, built once"""
+        intrinsics = cls.intrinsics_cache.get((img_w, img_h))
+        if intrinsics is None:
+            # The camera matrix
+            focal_length = 1 * img_w
+            cam_matrix = np.array([ [focal_length, 0, img_h / 2],
+                                    [0, focal_length, img_w / 2],
+                                    [0, 0, 1]])
+
+            # The distortion parameters
+            dist_matrix = np.zeros((4, 1), dtype=np.float64)
+
+            intrinsics = (cam_matrix, dist_matrix)
+            cls.intrinsics_cache[(img_w, img_h)] = intrinsics
+        return intrinsics
+
+    def reset(self):
+        """Forget the previous pose (face lost or resolution changed)"""
+        self.size = None
+        self.face_2d = None
+        self.rot_vec = None
+        self.trans_vec = None
+        self.angles = None
+
+    def estimate(self, face_2d, face_3d, img_w, img_h):
+        """Return (pitch, yaw, roll) in the detector's degree scale, (None, None, None) on failure"""
+        if self.size != (img_w, img_h):
+            self.reset()
+            self.size = (img_w, img_h)
+
+        # Landmarks barely moved, the pose is the same
+        if self.angles is not None and np.abs(face_2d - self.face_2d).max() <= self.motion_threshold:
+            return self.angles
+
+        cam_matrix, dist_matrix = self.get_intrinsics(img_w, img_h)
+        if self.rot_vec is None:
+            success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
+        else:
+            # Warm start from the previous frame's pose
+            success, rot_vec, trans_vec = cv2.solvePnP(
+                face_3d, face_2d, cam_matrix, dist_matrix,
+                rvec=self.rot_vec.copy(), tvec=self.trans_vec.copy(), useExtrinsicGuess=True
+            )
+        if not success:
+            self.reset()
+            return None, None, None
+
+        # Get rotational matrix
+        rmat, _ = cv2.Rodrigues(rot_vec)
+
+        # Get angles
+        angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+
+        self.face_2d = face_2d
+        self.rot_vec = rot_vec
+        self.trans_vec = trans_vec
+        self.angles = (angles[0] * 360, angles[1] * 360, angles[2] * 360)
+        return self.angles
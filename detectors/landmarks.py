@@ -0,0 +1,93 @@
+import numpy as np
+
+from .model_registry import create_face_mesh
+from .preprocess import FramePreprocessor
+
+
+def landmarks_to_array(face_landmarks):
+    """Convert a mediapipe landmark list to an (N, 3) float array of x, y, z"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark], dtype=np.float64)
+
+
+class LandmarkStage:
+    """Runs face mesh once per frame so every landmark based detector can share the result.
+
+    Landmarks of the first face are returned as an (N, 3) array, mirrored
+    (selfie view) and normalized to the full frame like the detectors always
+    used them, but the mirroring is done by negating x in landmark space
+    instead of flipping the pixels.
+    """
+
+    def __init__(self, face_mesh=None, roi_tracker=None, face_mesh_lock=None):
+        """
+        face_mesh: FaceMesh instance to use (a new one is created by default)
+        face_mesh_lock: lock to hold while calling a face_mesh shared between threads
+        roi_tracker: optional FaceRoiTracker, runs face mesh on a small crop around
+                     the face and only falls back to the full frame when tracking is lost
+        """
+        if face_mesh is None:
+            face_mesh = create_face_mesh()
+        self.face_mesh = face_mesh
+        self.roi_tracker = roi_tracker
+        self.face_mesh_lock = face_mesh_lock
+        self.preprocessor = FramePreprocessor()
+
+    def process(self, frame):
+        """Return the (N, 3) landmark array for a BGR frame (mirrored for selfie view), None if no face."""
+        img_h, img_w = frame.shape[:2]
+
+        if self.roi_tracker is not None:
+            crop, box, size = self.roi_tracker.crop(frame)
+            if crop is not None:
+                landmarks = self._run_face_mesh(crop, size)
+                if landmarks is not None:
+                    landmarks = self._to_frame(landmarks, box, img_w, img_h)
+                    self.roi_tracker.update_from_landmarks(landmarks, img_w, img_h)
+                    return landmarks
+                # Tracking lost, fall back to the full frame
+                self.roi_tracker.reset()
+
+        landmarks = self._run_face_mesh(frame)
+        if landmarks is not None:
+            landmarks = self._to_frame(landmarks, None, img_w, img_h)
+            if self.roi_tracker is not None:
+                self.roi_tracker.update_from_landmarks(landmarks, img_w, img_h)
+        return landmarks
+
+    def set_person_box(self, box, img_w, img_h):
+        """Person box (x0, y0, x1, y1) from ObjectDetector, used to pick up a lost face"""
+        if self.roi_tracker is not None:
+            self.roi_tracker.update_from_box(box, img_w, img_h)
+
+    def _run_face_mesh(self, image, size=None):
+        rgb = self.preprocessor.to_rgb(image, size)
+
+        # To improve performance
+        rgb.flags.writeable = False
+        if self.face_mesh_lock is None:
+            results = self.face_mesh.process(rgb)
+        else:
+            with self.face_mesh_lock:
+                results = self.face_mesh.process(rgb)
+        rgb.flags.writeable = True
+
+        if not results.multi_face_landmarks:
+            return None
+        return landmarks_to_array(results.multi_face_landmarks[0])
+
+    def _to_frame(self, landmarks, box, img_w, img_h):
+        """Map landmarks of the (unmirrored) input image to mirrored, full-frame normalized coordinates"""
+        if box is None:
+            offset_x, offset_y, scale_x, scale_y = 0.0, 0.0, 1.0, 1.0
+        else:
+            x0, y0, x1, y1 = box
+            offset_x, offset_y = x0 / img_w, y0 / img_h
+            scale_x, scale_y = (x1 - x0) / img_w, (y1 - y0) / img_h
+
+        # The mesh topology is left/right symmetric, so mirroring x gives the same
+        # geometry as running face mesh on a flipped image
+        landmarks[:, 0] = (1.0 - offset_x) - landmarks[:, 0] * scale_x
+        landmarks[:, 1] = offset_y + landmarks[:, 1] * scale_y
+        # z uses the same scale as x
+        landmarks[:, 2] *= scale_x
+        return landmarks
@@ -0,0 +1,129 @@
+"""Where the models live and how they are loaded.
+
+Nothing heavy happens at import time: mediapipe, ultralytics / torch are
+imported and the weights are loaded the first time a model is asked for
+(or up front with prewarm()). Paths are resolved against the repository's
+models/ directory, or CHEATING_MODELS_DIR when set, so they work on every
+platform and from any working directory.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(os.getenv("CHEATING_MODELS_DIR", Path(__file__).resolve().parent.parent / "models"))
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "yolo11n.pt")
+
+
+def model_path(name):
+    """Absolute path of a model file, absolute names are returned unchanged"""
+    path = Path(name)
+    return path if path.is_absolute() else MODELS_DIR / path
+
+
+def load_yolo():
+    from ultralytics import YOLO
+
+    path = model_path(YOLO_WEIGHTS)
+    # A missing file is downloaded by ultralytics into the working directory, make that explicit
+    return YOLO(str(path) if path.exists() else YOLO_WEIGHTS)
+
+
+def warm_up_yolo(model):
+    model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+
+def create_face_mesh(static_image_mode=False, warm_up=False):
+    """New FaceMesh graph with the settings every detector uses.
+
+    Face mesh graphs keep tracking state, so they are not shared through the
+    registry; each LandmarkStage (or SessionManager in static image mode) has its own.
+    """
+    import mediapipe as mp
+
+    options = dict(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5
+    )
+    if not static_image_mode:
+        options["min_tracking_confidence"] = 0.5
+    face_mesh = mp.solutions.face_mesh.FaceMesh(**options)
+    if warm_up:
+        # The first process() call allocates the graph's buffers, an empty frame has no tracking state
+        face_mesh.process(np.zeros((256, 256, 3), dtype=np.uint8))
+    return face_mesh
+
+
+class ModelRegistry:
+    """Process wide, lazily loaded models. Loading is thread safe and happens once."""
+
+    def __init__(self):
+        self.loaders = {}
+        self.models = {}
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    def register(self, name, loader, warm_up=None):
+        """loader() returns the model, warm_up(model) runs one dummy inference"""
+        with self.lock:
+            self.loaders[name] = (loader, warm_up)
+            self.load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name, warm_up=False):
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        loader, warm_up_model = self.loaders[name]
+        with self.load_locks[name]:
+            model = self.models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = loader()
+                if warm_up and warm_up_model is not None:
+                    warm_up_model(model)
+                logger.info("Loaded %s in %.2f s", name, time.perf_counter() - start)
+                self.models[name] = model
+        return model
+
+    def prewarm(self, names=None):
+        """Load (and warm up) models now instead of on the first frame"""
+        for name in names or list(self.loaders):
+            self.get(name, warm_up=True)
+
+
+registry = ModelRegistry()
+registry.register("yolo", load_yolo, warm_up_yolo)
+
+
+def get_detector_backend(backend="ultralytics", path=None, threads=None, warm_up=False):
+    """ObjectDetector inference backend (see yolo_backends), one per configuration and process"""
+    from .yolo_backends import create_backend
+
+    if path is not None:
+        path = model_path(path)
+    key = ("detector_backend", backend, str(path), threads)
+    if key not in registry.loaders:
+        registry.register(key, lambda: create_backend(backend, path, threads), lambda model: model.warm_up())
+    return registry.get(key, warm_up)
+
+
+def prewarm(yolo=True, face_mesh=True, object_detector_kwargs=None):
+    """Load the shared models and initialize mediapipe before the first frame arrives.
+
+    object_detector_kwargs: ObjectDetector arguments, their backend is the one warmed up
+    """
+    if yolo:
+        kwargs = object_detector_kwargs or {}
+        get_detector_backend(kwargs.get("backend", "ultralytics"), kwargs.get("model_path"), kwargs.get("threads"),
+                             warm_up=True)
+    if face_mesh:
+        # Imports mediapipe and runs one graph, later graphs start much faster
+        create_face_mesh(static_image_mode=True, warm_up=True).close()
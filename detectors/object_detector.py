@@ -1,16 +1,27 @@
 from .base import BaseDetector
-from ultralytics import YOLO
+from .model_registry import get_detector_backend
 import cv2 
-import time
+import numpy as np
 
 
 class ObjectDetector(BaseDetector):
     
-    model = None
+    # YOLO's default confidence, boxes below it never reached the post-processing
+    MODEL_CONF = 0.25
     
-    def __init__(self,alert_threshold_seconds = 5,conf_threshold=0.6):
-        if ObjectDetector.model is None :
-            ObjectDetector.model = YOLO(r'models\yolo11n.pt')
+    def __init__(self,alert_threshold_seconds = 5,conf_threshold=0.6,run_interval=5, clock=None,
+                 backend="ultralytics", model_path=None, threads=None):
+        """
+        clock: callable returning seconds, for the alert timers outside a pipeline (default time.time)
+        backend: "ultralytics" (yolo11n.pt through PyTorch), "onnxruntime" or "openvino"
+        model_path: exported model of the onnxruntime / openvino backends, relative to models/
+        threads: intra-op threads of the backend (default: the runtime's own)
+        """
+        if clock is not None:
+            self.clock = clock
+        # Shared by every detector with the same settings, loaded once per process on first use
+        # (or already warmed up by model_registry.prewarm())
+        self.backend = get_detector_backend(backend, model_path, threads)
         self.no_person_start_time = None        
         self.no_object_start_time = None
         self.object_present = False
@@ -18,55 +29,110 @@ class ObjectDetector(BaseDetector):
         self.alert_threshold_seconds = alert_threshold_seconds
         self.conf_threshold = conf_threshold
         self.cheating_elements = [63,64,65,66,67,73]
+        # Only person + cheating classes are returned by the model at all
+        self.model_classes = [0] + self.cheating_elements
+        self.model_conf = min(self.MODEL_CONF, conf_threshold)
+        # class id -> is a cheating object, for filtering all boxes at once
+        self.cheating_mask = np.zeros(len(self.backend.names), dtype=bool)
+        self.cheating_mask[self.cheating_elements] = True
         self.person_avaliable = False
+        # True once nobody / a cheating object was seen for alert_threshold_seconds
+        self.no_person_alert = False
+        self.object_alert = False
+        # highest confidence of the cheating objects in the last frame
+        self.max_confidence = 0.0
+        # (x0, y0, x1, y1) of the most confident person, used as a face search region
+        self.person_box = None
+        # YOLO is the most expensive detector, by default it runs on every 5th frame
+        self.run_interval = run_interval
 
-    def detect(self , frame):
-        results = ObjectDetector.model(frame)
-        person_count, object_present,labels = self._process_detections(frame, results)
-        status = self._check_alerts(person_count, object_present)
+    def detect(self , frame, context=None):
+        with self.stage(context, "inference"):
+            detections = self.backend.predict([frame], self.model_classes, self.model_conf)[0]
+        return self._build_result(frame, detections, context)
+
+    @classmethod
+    def detect_batch(cls, detectors, frames, batch_size=16, timestamps=None):
+        """Run frames of many sessions through the shared model in batched forward passes.
+
+        detectors: one ObjectDetector per session, keeps that session's timer state
+        frames: the frame of each session, in the same order
+        timestamps: optional timestamp of each frame for the alert timers (default: wall clock)
+        Returns the detect() result of every session, in the same order.
+        """
+        if len(detectors) != len(frames):
+            raise ValueError("detect_batch needs exactly one frame per detector")
+
+        # Detectors with different backends can't share a model call
+        groups = {}
+        for i, detector in enumerate(detectors):
+            groups.setdefault(id(detector.backend), []).append(i)
+
+        outputs = [None] * len(detectors)
+        for indices in groups.values():
+            backend = detectors[indices[0]].backend
+            # One model call serves every session, each one filters its own boxes afterwards
+            classes = sorted({c for i in indices for c in detectors[i].model_classes})
+            conf = min(detectors[i].model_conf for i in indices)
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                detections = backend.predict([frames[i] for i in batch], classes, conf)
+                # Results come back in input order, hand each one to its own session
+                for i, frame_detections in zip(batch, detections):
+                    timestamp = timestamps[i] if timestamps is not None else None
+                    outputs[i] = detectors[i]._build_result(frames[i], frame_detections, current_time=timestamp)
+        return outputs
+
+    def _build_result(self, frame, detections, context=None, current_time=None):
+        with self.stage(context, "postprocess"):
+            person_count, object_present,labels = self._process_detections(frame, detections)
+        with self.stage(context, "state_update"):
+            status = self._check_alerts(person_count, object_present,
+                                        current_time if context is None else self.frame_time(context))
         # Return combined result
         return {
         "person_count": person_count,
         "person_avaliable": status["person_avaliable"],
         "object_present": status["object_present"],
         "label": labels,
+        "person_box": self.person_box,
         "no_person_start_time": status["no_person_start_time"],
         "no_object_start_time": status["no_object_start_time"],
-        "alert_threshold_seconds": self.alert_threshold_seconds,
-        "conf_threshold": self.conf_threshold,
-        "cheating_elements": self.cheating_elements
+        "no_person_alert": status["no_person_alert"],
+        "object_alert": status["object_alert"],
+        "confidence": self.max_confidence
         }
 
-    def _process_detections(self,frame, results):
-        # Loop YOLO results and update counts, draw boxes
-        self.person_count = 0  
-        self.object_present = False
-        labels = []
-        for box in results[0].boxes :
-            cls = int(box.cls[0])
-            if cls in self.cheating_elements :
-                conf = float(box.conf[0])
-                # x1,y1,x2,y2 = map(int,box.xyxy[0])            
-                if conf > self.conf_threshold :  
-                    # cv2.rectangle(frame , (x1, y1), (x2, y2),(0,255,0),2)
-                    labels.append(f"{ObjectDetector.model.names[int(cls)]} ({conf:.2f})")
-                    # cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-            if cls == 0 : 
-                self.person_count = self.person_count + 1
-
-            # self.current_time = time.time()
-
-            
-            if cls in self.cheating_elements:
-                self.object_present = True
+    def _process_detections(self,frame, detections):
+        # Count people and flag cheating objects over the whole cls / conf arrays at once
+        cls, conf = detections.cls, detections.conf
+        keep = conf > self.model_conf
+        cls, conf = cls[keep], conf[keep]
+
+        is_cheating = self.cheating_mask[cls]
+        self.person_count = int(np.count_nonzero(cls == 0))
+        self.object_present = bool(is_cheating.any())
+        self.max_confidence = float(conf[is_cheating].max()) if self.object_present else 0.0
+
+        self.person_box = None
+        persons = np.flatnonzero(cls == 0)
+        if len(persons):
+            best = persons[np.argmax(conf[persons])]
+            box = detections.xyxy[int(np.flatnonzero(keep)[best])]
+            self.person_box = [int(v) for v in box.tolist()]
+
+        flagged = is_cheating & (conf > self.conf_threshold)
+        names = self.backend.names
+        labels = [f"{names[c]} ({p:.2f})" for c, p in zip(cls[flagged].tolist(), conf[flagged].tolist())]
 
         return self.person_count , self.object_present ,labels
 
-    def _check_alerts(self,person_count, object_present):
+    def _check_alerts(self,person_count, object_present, current_time=None):
         # Timer logic for alerts
          # Alert Logic
-        current_time = time.time()
+        # current_time: frame timestamp (media time for recordings), the detector's clock by default
+        if current_time is None:
+            current_time = self.clock()
         self.person_avaliable = False
 
         # Person check
@@ -74,6 +140,7 @@ class ObjectDetector(BaseDetector):
             # At least one person detected
             self.person_avaliable = True
             self.no_person_start_time = None
+            self.no_person_alert = False
         else:
             # No person detected
             if self.no_person_start_time is None:
@@ -81,6 +148,7 @@ class ObjectDetector(BaseDetector):
             elif (current_time - self.no_person_start_time) >= self.alert_threshold_seconds:
                 # 5 sec se zyada koi banda nahi
                 self.person_avaliable = False
+                self.no_person_alert = True
 
 
         # Object check
@@ -93,13 +161,17 @@ class ObjectDetector(BaseDetector):
                 # cv2.putText(frame, "ALERT: Cheating object detected for 5 seconds!", (30, 90),
                 #             cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 self.object_present = True
+                self.object_alert = True
         else:
             self.no_object_start_time = None    
+            self.object_alert = False
 
         return {
         "person_count": person_count,
         "person_avaliable": self.person_avaliable,
         "object_present": self.object_present,
         "no_person_start_time": self.no_person_start_time,
-        "no_object_start_time": self.no_object_start_time
+        "no_object_start_time": self.no_object_start_time,
+        "no_person_alert": self.no_person_alert,
+        "object_alert": self.object_alert
     }
\ No newline at end of file
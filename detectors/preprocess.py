@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """Prepares frames for mediapipe in reusable buffers instead of fresh copies.
+
+    The BGR -> RGB conversion (and the resize of a face crop) write into
+    buffers that are only reallocated when the frame size changes. The
+    selfie-view mirror is not done on pixels at all, LandmarkStage mirrors
+    the landmarks instead.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def _get_buffer(self, name, shape):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.buffers[name] = buffer
+        return buffer
+
+    def to_rgb(self, image, size=None):
+        """Return image as RGB in a reused buffer, optionally resized to size=(width, height)"""
+        if size is not None and size != (image.shape[1], image.shape[0]):
+            resized = self._get_buffer("resized", (size[1], size[0], 3))
+            cv2.resize(image, size, dst=resized, interpolation=cv2.INTER_AREA)
+            image = resized
+
+        # Resized crops and full frames alternate when tracking is lost, each keeps its own buffer
+        rgb = self._get_buffer("rgb" if size is None else "resized_rgb", image.shape)
+        rgb.flags.writeable = True
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb)
+        return rgb
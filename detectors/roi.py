@@ -0,0 +1,68 @@
+class FaceRoiTracker:
+    """Keeps a padded face region so face mesh can run on a small crop instead of the full frame.
+
+    The region follows the previous frame's landmarks, or starts from a
+    person box of ObjectDetector. It is dropped as soon as face mesh finds no
+    face in the crop, the landmark stage then falls back to the full frame.
+    Boxes are (x0, y0, x1, y1) pixels of the original (not mirrored) frame.
+    """
+
+    def __init__(self, padding=0.35, input_size=256, min_size=32):
+        """
+        padding: margin added around the face, as a fraction of the face size
+        input_size: every crop is resized to this many pixels square, so the
+                    preprocessing buffers keep their shape from frame to frame
+        min_size: regions smaller than this are not tracked
+        """
+        self.padding = padding
+        self.input_size = input_size
+        self.min_size = min_size
+        self.box = None
+
+    def crop(self, frame):
+        """Return (crop, box, size) of the tracked region, (None, None, None) when nothing is tracked.
+
+        crop is a view into frame (no copy), size is the (width, height) it
+        should be resized to before running face mesh.
+        """
+        if self.box is None:
+            return None, None, None
+        x0, y0, x1, y1 = self.box
+        # Face mesh works on ~200px inputs; a fixed size instead of the crop's own,
+        # which changes by a pixel or two every frame, keeps the buffers reused
+        return frame[y0:y1, x0:x1], self.box, (self.input_size, self.input_size)
+
+    def update_from_landmarks(self, landmarks, img_w, img_h):
+        """Track the padded bounding box of an (N, 3) array of mirrored, full-frame normalized landmarks"""
+        min_x, min_y = landmarks[:, :2].min(axis=0)
+        max_x, max_y = landmarks[:, :2].max(axis=0)
+        # Landmarks are mirrored (selfie view), the box is in original frame pixels
+        self._set_box((1 - max_x) * img_w, min_y * img_h, (1 - min_x) * img_w, max_y * img_h, img_w, img_h)
+
+    def update_from_box(self, box, img_w, img_h):
+        """Start tracking from a person box, only used while no face is tracked"""
+        if self.box is not None or box is None:
+            return
+        x0, y0, x1, y1 = box
+        # The face is in the upper part of the person box
+        self._set_box(x0, y0, x1, min(y1, y0 + (x1 - x0)), img_w, img_h)
+
+    def reset(self):
+        self.box = None
+
+    def _set_box(self, left, top, right, bottom, img_w, img_h):
+        # Square region around the center, padded on every side
+        size = int(max(right - left, bottom - top) * (1 + 2 * self.padding))
+        center_x = (left + right) / 2
+        center_y = (top + bottom) / 2
+        # Near an edge the square is moved inside the frame rather than cut, so it stays
+        # square and resizing it to the input size does not stretch the face
+        x0 = min(max(int(center_x - size / 2), 0), max(img_w - size, 0))
+        y0 = min(max(int(center_y - size / 2), 0), max(img_h - size, 0))
+        x1 = min(x0 + size, img_w)
+        y1 = min(y0 + size, img_h)
+
+        if x1 - x0 < self.min_size or y1 - y0 < self.min_size:
+            self.box = None
+        else:
+            self.box = (x0, y0, x1, y1)
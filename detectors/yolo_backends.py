@@ -0,0 +1,260 @@
+"""Inference backends of ObjectDetector.
+
+Every backend turns BGR frames into Detections (numpy xyxy boxes in frame
+pixels, confidences and class ids) with YOLO's predict semantics: best
+class per box, conf > threshold, class filter, class-aware NMS. That way
+ObjectDetector's post-processing and alert logic are the same whichever
+backend runs the model:
+
+    ultralytics  the .pt model through ultralytics / PyTorch (default)
+    onnxruntime  a model exported with `yolo export format=onnx`
+    openvino     a model exported with `yolo export format=openvino`
+
+The exported backends do the letterboxing and NMS in OpenCV / numpy, so
+they need neither torch nor ultralytics at runtime.
+"""
+import ast
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+# Boxes of one frame: xyxy (N, 4) float32 in frame pixels, conf (N,) float32, cls (N,) int64
+Detections = namedtuple("Detections", ["xyxy", "conf", "cls"])
+
+# ultralytics predict defaults
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+MAX_NMS = 30000
+MAX_WH = 7680
+
+BACKENDS = ("ultralytics", "onnxruntime", "openvino")
+
+
+class UltralyticsBackend:
+    """The ultralytics YOLO model, shared through the model registry"""
+
+    name = "ultralytics"
+    # The registry's model is shared by every instance, ultralytics predictors are not thread safe
+    lock = threading.Lock()
+
+    def __init__(self, model=None, threads=None):
+        """
+        model: loaded YOLO model (default: model_registry's "yolo")
+        threads: torch intra-op threads, note that this is a process wide setting
+        """
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        if model is None:
+            from .model_registry import registry
+            model = registry.get("yolo")
+        self.model = model
+        self.names = model.names
+
+    def predict(self, frames, classes=None, conf=0.25):
+        with self.lock:
+            results = self.model(list(frames), classes=classes, conf=conf, verbose=False)
+        # One device copy per array
+        return [
+            Detections(
+                result.boxes.xyxy.cpu().numpy(),
+                result.boxes.conf.cpu().numpy(),
+                result.boxes.cls.cpu().numpy().astype(np.int64)
+            )
+            for result in results
+        ]
+
+    def warm_up(self):
+        self.predict([np.zeros((640, 640, 3), dtype=np.uint8)])
+
+
+class ExportedYoloBackend(ABC):
+    """Letterboxing and NMS of exported YOLO detection models, subclasses only run the graph"""
+
+    def __init__(self, input_size, names, batch_size=None, end2end=False):
+        # (height, width) of the model input
+        self.input_size = input_size
+        self.names = names
+        # Static batch dimension of the model input, None = dynamic
+        self.batch_size = batch_size
+        # Models exported with NMS inside return (batch, max_det, 6) rows of x0, y0, x1, y1, conf, cls
+        self.end2end = end2end
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def infer(self, blob):
+        """Run the graph on an NCHW float32 batch, returns the raw output array"""
+        pass
+
+    def predict(self, frames, classes=None, conf=0.25):
+        frames = list(frames)
+        if self.batch_size is None:
+            # Dynamic batch dimension, all frames in one run
+            blobs = [self.letterbox(frame) for frame in frames]
+            with self.lock:
+                raw = self.infer(np.concatenate([blob for blob, _, _ in blobs]))
+            return [self.decode(output, frame, gain, pad, classes, conf)
+                    for output, frame, (_, gain, pad) in zip(raw, frames, blobs)]
+
+        # Static batch dimension (the export default is 1), one run per frame
+        outputs = []
+        for frame in frames:
+            blob, gain, pad = self.letterbox(frame)
+            with self.lock:
+                raw = self.infer(blob)
+            outputs.append(self.decode(raw[0], frame, gain, pad, classes, conf))
+        return outputs
+
+    def letterbox(self, frame):
+        """Resize keeping the aspect ratio, pad to the input size (grey 114) like ultralytics' LetterBox"""
+        height, width = frame.shape[:2]
+        input_h, input_w = self.input_size
+        gain = min(input_h / height, input_w / width)
+        new_w, new_h = int(round(width * gain)), int(round(height * gain))
+        dw, dh = (input_w - new_w) / 2, (input_h - new_h) / 2
+        if (new_w, new_h) != (width, height):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        # BGR -> RGB, HWC -> NCHW, 0..1 float32 in one pass
+        blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, swapRB=True)
+        return blob, gain, (left, top)
+
+    def decode(self, output, frame, gain, pad, classes, conf):
+        if self.end2end:
+            boxes, scores, cls = output[:, :4], output[:, 4], output[:, 5].astype(np.int64)
+            keep = scores > conf
+            if classes is not None:
+                keep &= np.isin(cls, classes)
+            boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+        else:
+            # (4 + classes, anchors) -> best class per anchor, like non_max_suppression without multi_label
+            class_scores = output[4:]
+            cls = class_scores.argmax(0)
+            scores = class_scores[cls, np.arange(class_scores.shape[1])]
+            keep = scores > conf
+            if classes is not None:
+                keep &= np.isin(cls, classes)
+            boxes, scores, cls = output[:4, keep].T, scores[keep], cls[keep].astype(np.int64)
+            if len(scores) > MAX_NMS:
+                top = np.argsort(-scores)[:MAX_NMS]
+                boxes, scores, cls = boxes[top], scores[top], cls[top]
+
+            # cx, cy, w, h -> x, y, w, h, each class shifted away so NMS never compares two classes
+            xywh = boxes.copy()
+            xywh[:, :2] -= xywh[:, 2:] / 2
+            offset = xywh.copy()
+            offset[:, :2] += cls[:, None] * MAX_WH
+            indices = cv2.dnn.NMSBoxes(offset.tolist(), scores.tolist(), conf, IOU_THRESHOLD)
+            indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:MAX_DETECTIONS]
+            boxes = np.concatenate([xywh[indices, :2], xywh[indices, :2] + xywh[indices, 2:]], axis=1)
+            scores, cls = scores[indices], cls[indices]
+
+        # Back from the letterboxed input to frame pixels
+        boxes = (boxes - np.array(pad * 2, dtype=np.float32)) / gain
+        height, width = frame.shape[:2]
+        np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+        return Detections(boxes.astype(np.float32), scores.astype(np.float32), cls)
+
+    def warm_up(self):
+        self.predict([np.zeros((self.input_size[0], self.input_size[1], 3), dtype=np.uint8)])
+
+
+def _parse_names(value):
+    """Class names from export metadata ("{0: 'person', ...}" string or dict)"""
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    if not value:
+        raise ValueError("the exported model has no class names in its metadata, export it with ultralytics")
+    return {int(key): name for key, name in value.items()}
+
+
+def _static_dim(dim):
+    return dim if isinstance(dim, int) and dim > 0 else None
+
+
+class OnnxRuntimeBackend(ExportedYoloBackend):
+    name = "onnxruntime"
+
+    def __init__(self, path, threads=None):
+        """
+        path: exported .onnx file
+        threads: intra-op threads of the session (default: onnxruntime's, all physical cores)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            # One frame at a time, the graph has nothing to run in parallel between operators
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        input_size = (_static_dim(model_input.shape[2]), _static_dim(model_input.shape[3]))
+        if None in input_size:
+            input_size = tuple(ast.literal_eval(metadata.get("imgsz", "[640, 640]")))
+        super().__init__(input_size, _parse_names(metadata.get("names")), batch_size=_static_dim(model_input.shape[0]),
+                         end2end=metadata.get("end2end") == "True")
+
+    def infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedYoloBackend):
+    name = "openvino"
+
+    def __init__(self, path, threads=None):
+        """
+        path: exported model directory (or its .xml file)
+        threads: inference threads of the compiled model (default: OpenVINO's)
+        """
+        import openvino as ov
+
+        path = Path(path)
+        metadata_path = (path if path.is_dir() else path.parent) / "metadata.yaml"
+        if path.is_dir():
+            path = next(path.glob("*.xml"))
+        metadata = {}
+        if metadata_path.exists():
+            import yaml
+            with open(metadata_path) as f:
+                metadata = yaml.safe_load(f) or {}
+
+        core = ov.Core()
+        config = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+        self.compiled = core.compile_model(core.read_model(str(path)), "CPU", config)
+        self.request = self.compiled.create_infer_request()
+        shape = self.compiled.input(0).get_partial_shape()
+        dims = [dim.get_length() if dim.is_static else None for dim in shape]
+        input_size = (dims[2], dims[3])
+        if None in input_size:
+            input_size = tuple(metadata.get("imgsz", (640, 640)))
+        super().__init__(input_size, _parse_names(metadata.get("names")), batch_size=dims[0],
+                         end2end=bool(metadata.get("end2end")))
+
+    def infer(self, blob):
+        return self.request.infer({0: blob})[self.compiled.output(0)]
+
+
+def create_backend(name="ultralytics", path=None, threads=None):
+    """Backend by name, path is the exported model (onnxruntime / openvino)"""
+    if name == "ultralytics":
+        return UltralyticsBackend(threads=threads)
+    if name not in BACKENDS:
+        raise ValueError(f"unknown object detector backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if path is None:
+        raise ValueError(f"the {name} backend needs the path of an exported model")
+    if name == "onnxruntime":
+        return OnnxRuntimeBackend(path, threads)
+    return OpenVinoBackend(path, threads)
@@ -2,9 +2,19 @@ import cv2
 from detectors.face_detector import FaceDetector
 from detectors.object_detector import ObjectDetector
 from detectors.gaze_detector import GazeDetector
+from detectors.landmarks import LandmarkStage
+from detectors.model_registry import prewarm
+from detectors.roi import FaceRoiTracker
 from pipeline.detection_pipeline import DetectionPipeline
+from pipeline.capture import CaptureThread
+from pipeline.scheduler import AdaptiveScheduler
+from services.screenshot_service import ScreenshotService
+from services.violation_service import ViolationEventTracker
 
 def run_app():
+    # Load the models and run them once, so the first frames don't look slow to the scheduler
+    prewarm()
+
     # Initialize detectors
     face_detector = FaceDetector()
     object_detector = ObjectDetector()
@@ -13,25 +23,44 @@ def run_app():
     # Create pipeline
     pipeline = DetectionPipeline(
         detectors=[face_detector, object_detector, gaze_detector],
-        frame_skip=3  # Process every 3rd frame
+        # Fit the detectors into ~10 FPS: YOLO gets skipped first, gaze runs on every frame
+        scheduler=AdaptiveScheduler(target_fps=10, max_intervals={"GazeDetector": 1}),
+        # One face mesh pass shared by face and gaze detectors, on a crop around the face
+        landmark_stage=LandmarkStage(roi_tracker=FaceRoiTracker()),
+        parallel=True  # Run YOLO, head pose and gaze at the same time
     )
 
-    # Open camera
-    cap = cv2.VideoCapture(1)
+    # Only violation starts / ends are reported, not every frame's detector state
+    violations = ViolationEventTracker(session_id="local")
+    # Evidence is encoded and written on background threads
+    screenshots = ScreenshotService()
+
+    # Open camera, frames are read on their own thread
+    capture = CaptureThread(1).start()
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        item = capture.read(timeout=1.0)
+        if item is None:
+            if capture.finished:
+                break
+            continue
+        _, timestamp, frame = item
 
-        output = pipeline.run(frame)
-        if output:
-            print(output)  # Or display results on frame
+        output = pipeline.run(frame, timestamp)
+        for event in violations.update(output, timestamp):
+            print(event)  # Or display results on frame
+            if event["event"] == "start":
+                screenshots.capture(frame, event)
 
         cv2.imshow("Frame", frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    cap.release()
+    capture.stop()
+    for event in violations.flush():
+        print(event)
+    print(f"Dropped frames: {capture.dropped_frames}")
+    pipeline.close()
+    screenshots.close()
     cv2.destroyAllWindows()
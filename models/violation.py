@@ -0,0 +1,204 @@
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+# Columns of a stored violation event, in insert order
+VIOLATION_FIELDS = ("session_id", "student_id", "event", "type", "direction", "timestamp", "duration", "confidence")
+
+
+class ViolationStore(ABC):
+    """Append-only storage of violation events (see services.violation_service).
+
+    Backends only need a batched insert and the session / student queries,
+    so a Postgres store can implement the same interface later.
+    """
+
+    @abstractmethod
+    def write_many(self, events):
+        """Insert a batch of event dicts in one transaction"""
+
+    @abstractmethod
+    def query(self, session_id=None, student_id=None, since=None, limit=1000):
+        """Events of a session and/or student, oldest first"""
+
+    def close(self):
+        pass
+
+
+class SQLiteViolationStore(ViolationStore):
+    """SQLite store in WAL mode, readers (the API) never wait for the writer."""
+
+    def __init__(self, path=os.path.join("storage", "violations.db")):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # the writer thread's connection; with WAL the API reads through its own without waiting for a batch
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # with WAL, NORMAL only risks the last batch on power loss, not corruption
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS violations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT,
+                    student_id TEXT,
+                    event TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    direction TEXT,
+                    timestamp REAL NOT NULL,
+                    duration REAL,
+                    confidence REAL
+                )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_violations_session ON violations (session_id, timestamp)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_violations_student ON violations (student_id, timestamp)")
+        # sqlite3 connections are not safe for concurrent use, one read connection per API thread
+        self.readers = threading.local()
+        self.reader_connections = []
+        self.readers_lock = threading.Lock()
+
+    def write_many(self, events):
+        rows = [tuple(_to_column(event.get(field)) for field in VIOLATION_FIELDS) for event in events]
+        if not rows:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO violations ({', '.join(VIOLATION_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in VIOLATION_FIELDS)})",
+                rows
+            )
+
+    def query(self, session_id=None, student_id=None, since=None, limit=1000):
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(str(session_id))
+        if student_id is not None:
+            conditions.append("student_id = ?")
+            params.append(str(student_id))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        rows = self._reader().execute(
+            f"SELECT {', '.join(VIOLATION_FIELDS)} FROM violations {where} ORDER BY timestamp, id LIMIT ?",
+            params
+        ).fetchall()
+        return [dict(zip(VIOLATION_FIELDS, row)) for row in rows]
+
+    def _reader(self):
+        connection = getattr(self.readers, "connection", None)
+        if connection is None:
+            # read only, a query can never take the write lock
+            connection = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            self.readers.connection = connection
+            with self.readers_lock:
+                self.reader_connections.append(connection)
+        return connection
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+        with self.readers_lock:
+            for connection in self.reader_connections:
+                connection.close()
+            self.reader_connections.clear()
+
+
+def _to_column(value):
+    # ids may be ints or strings, numpy scalars come from the detectors
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class BufferedViolationWriter:
+    """Write-behind buffer in front of a ViolationStore.
+
+    append() only puts the event into a bounded in-memory buffer, so the
+    detection loop never waits for the database. A background thread writes
+    the buffer in batches every flush_interval seconds (or as soon as
+    batch_size events are waiting). When the buffer is full the oldest events
+    are dropped and counted in dropped_events. close() writes what is left.
+    """
+
+    def __init__(self, store, max_buffer=10000, batch_size=500, flush_interval=1.0):
+        """
+        store: ViolationStore the batches go to
+        max_buffer: most events kept in memory while the store is behind
+        batch_size: events written per transaction
+        flush_interval: seconds between flushes when there is little traffic
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=max_buffer)
+        self.dropped_events = 0
+        self.written_events = 0
+        self.condition = threading.Condition()
+        # only one flush at a time, so batches reach the store in order
+        self.flush_lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="violation-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, event):
+        self.extend((event,))
+
+    def extend(self, events):
+        with self.condition:
+            for event in events:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.dropped_events += 1
+                self.buffer.append(event)
+            if len(self.buffer) >= self.batch_size:
+                self.condition.notify()
+
+    def flush(self):
+        """Write everything buffered so far, on the calling thread"""
+        with self.flush_lock:
+            while True:
+                with self.condition:
+                    batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                if not batch:
+                    return
+                try:
+                    self.store.write_many(batch)
+                    self.written_events += len(batch)
+                except Exception:
+                    # a broken database must not take the detection loop down with it
+                    logger.exception("Dropping %d violation events that could not be written", len(batch))
+                    self.dropped_events += len(batch)
+
+    def _loop(self):
+        while self.running:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: not self.running or len(self.buffer) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+            self.flush()
+
+    def close(self):
+        """Stop the writer thread, write the rest of the buffer and close the store"""
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join(timeout=5)
+        self.flush()
+        self.store.close()
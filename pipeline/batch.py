@@ -0,0 +1,196 @@
+"""Offline analysis of recorded exam videos.
+
+Every video runs through its own DetectionPipeline (fresh detector state)
+as fast as the machine allows: videos are spread over a process pool, and
+inside a process a capture thread decodes the next frames while the
+detectors work on the current one. Durations come from the media
+timestamps, not the wall clock, so the result does not depend on how fast
+the video was processed.
+
+    python -m pipeline.batch recordings/ --output timelines/ --workers 4 --sample-fps 10
+    python -m pipeline.batch recordings/ --backend onnxruntime --model yolo11n.onnx
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".webm")
+
+
+def find_videos(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def build_pipeline(object_detector_kwargs=None):
+    from detectors.face_detector import FaceDetector
+    from detectors.gaze_detector import GazeDetector
+    from detectors.landmarks import LandmarkStage
+    from detectors.object_detector import ObjectDetector
+    from detectors.roi import FaceRoiTracker
+    from pipeline.detection_pipeline import DetectionPipeline
+
+    return DetectionPipeline(
+        detectors=[FaceDetector(), ObjectDetector(**(object_detector_kwargs or {})), GazeDetector()],
+        frame_skip=1,
+        landmark_stage=LandmarkStage(roi_tracker=FaceRoiTracker())
+    )
+
+
+def violations_from_events(events):
+    """Pair start/end events into {"type", "direction", "start", "end", "duration", "confidence"}"""
+    violations = []
+    for event in events:
+        if event["event"] == "end":
+            violations.append({
+                "type": event["type"],
+                "direction": event["direction"],
+                "start": event["timestamp"] - event["duration"],
+                "end": event["timestamp"],
+                "duration": event["duration"],
+                "confidence": event["confidence"],
+            })
+    return violations
+
+
+def analyze_video(path, sample_fps=None, object_detector_kwargs=None, buffer_size=8):
+    """Run one recording through a fresh pipeline, returns its violation timeline.
+
+    sample_fps: analyze about this many frames per second of video (None = every frame)
+    """
+    from pipeline.capture import CaptureThread, VideoFileSource
+    from services.violation_service import ViolationEventTracker
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    pipeline = build_pipeline(object_detector_kwargs)
+    tracker = ViolationEventTracker(session_id=name)
+    # Nothing may be dropped here, the reader waits for the detectors instead
+    capture = CaptureThread(VideoFileSource(path, sample_fps=sample_fps), buffer_size=buffer_size,
+                            drop_frames=False).start()
+
+    events = []
+    frames = 0
+    last_timestamp = 0.0
+    start = time.perf_counter()
+    try:
+        while True:
+            item = capture.read()
+            if item is None:
+                break
+            _, timestamp, frame = item
+            output = pipeline.run(frame, timestamp)
+            events.extend(tracker.update(output, timestamp))
+            frames += 1
+            last_timestamp = timestamp
+    finally:
+        capture.stop()
+        pipeline.close()
+    # Violations still going on at the end of the recording end with it
+    events.extend(tracker.flush(last_timestamp))
+    processing_seconds = time.perf_counter() - start
+
+    return {
+        "video": path,
+        "frames": frames,
+        "duration": last_timestamp,
+        "processing_seconds": processing_seconds,
+        # > 1 means faster than real time
+        "speed": last_timestamp / processing_seconds if processing_seconds > 0 else None,
+        "events": events,
+        "violations": violations_from_events(events),
+    }
+
+
+def _init_worker(threads):
+    # Several processes share the CPU, keep each one's thread pools small
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _analyze_file(path, sample_fps, object_detector_kwargs):
+    try:
+        return analyze_video(path, sample_fps=sample_fps, object_detector_kwargs=object_detector_kwargs)
+    except Exception as e:
+        return {"video": path, "error": f"{type(e).__name__}: {e}"}
+
+
+def analyze_directory(directory, output_dir=None, workers=None, threads_per_worker=None, sample_fps=None,
+                      object_detector_kwargs=None):
+    """Analyze every video of a directory on a process pool.
+
+    Yields each video's timeline as soon as it is done (and writes it to
+    output_dir/<video name>.json when output_dir is given).
+    """
+    videos = find_videos(directory)
+    if not videos:
+        return
+    workers = workers or max(1, min(len(videos), (os.cpu_count() or 2) // 2))
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    # onnxruntime / openvino have their own thread pools, keep them as small as torch's
+    object_detector_kwargs = {"threads": threads_per_worker, **(object_detector_kwargs or {})}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker,)
+    ) as executor:
+        futures = [executor.submit(_analyze_file, path, sample_fps, object_detector_kwargs) for path in videos]
+        for future in as_completed(futures):
+            timeline = future.result()
+            if output_dir:
+                name = os.path.splitext(os.path.basename(timeline["video"]))[0]
+                with open(os.path.join(output_dir, f"{name}.json"), "w") as f:
+                    json.dump(timeline, f, indent=2)
+            yield timeline
+
+
+def main(argv=None):
+    from detectors.yolo_backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory with the recorded videos")
+    parser.add_argument("--output", default="timelines", help="directory for the per-video JSON timelines")
+    parser.add_argument("--workers", type=int, help="videos analyzed at the same time (processes)")
+    parser.add_argument("--threads-per-worker", type=int, help="OpenCV / inference threads of every process")
+    parser.add_argument("--sample-fps", type=float, help="analyze this many frames per second of video")
+    parser.add_argument("--backend", default="ultralytics", choices=BACKENDS,
+                        help="inference backend of the object detector")
+    parser.add_argument("--model", help="exported model of the onnxruntime / openvino backend")
+    args = parser.parse_args(argv)
+    object_detector_kwargs = {"backend": args.backend, "model_path": args.model}
+
+    start = time.perf_counter()
+    total_duration = 0.0
+    failed = 0
+    for timeline in analyze_directory(args.directory, args.output, args.workers, args.threads_per_worker,
+                                      args.sample_fps, object_detector_kwargs):
+        if "error" in timeline:
+            failed += 1
+            print(f"{timeline['video']}: {timeline['error']}", file=sys.stderr)
+            continue
+        total_duration += timeline["duration"]
+        print(f"{timeline['video']}: {len(timeline['violations'])} violations, "
+              f"{timeline['duration']:.0f} s of video in {timeline['processing_seconds']:.0f} s")
+
+    elapsed = time.perf_counter() - start
+    if elapsed > 0 and total_duration:
+        print(f"{total_duration:.0f} s of video in {elapsed:.0f} s ({total_duration / elapsed:.1f}x real time)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class CameraSource:
+    """Frames from a local camera, timestamped with the capture time."""
+
+    def __init__(self, index=0):
+        self.cap = cv2.VideoCapture(index)
+        # Keep OpenCV's own buffer small, the capture thread does the buffering
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return ret, frame, time.time()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource:
+    """Frames from a recorded video file, timestamped with the media position in seconds."""
+
+    def __init__(self, path, sample_fps=None):
+        """
+        sample_fps: only return about this many frames per second of video, the
+                    frames in between are grabbed but never decoded
+        """
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.sample_interval = 1.0 / sample_fps if sample_fps else None
+        self.next_sample = 0.0
+
+    def read(self):
+        if self.sample_interval is None:
+            ret, frame = self.cap.read()
+            if not ret:
+                return False, None, None
+            return True, frame, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+        while self.cap.grab():
+            timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if timestamp + 1e-6 < self.next_sample:
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            self.next_sample = timestamp + self.sample_interval
+            return True, frame, timestamp
+        return False, None, None
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource:
+    """Frames from the images of a directory (sorted by name), useful for headless runs."""
+
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+    def __init__(self, path, fps=30):
+        self.path = path
+        self.fps = fps
+        self.files = sorted(
+            name for name in os.listdir(path) if name.lower().endswith(self.IMAGE_EXTENSIONS)
+        )
+        self.position = 0
+
+    def read(self):
+        while self.position < len(self.files):
+            name = self.files[self.position]
+            timestamp = self.position / self.fps
+            self.position += 1
+            frame = cv2.imread(os.path.join(self.path, name))
+            if frame is not None:
+                return True, frame, timestamp
+        return False, None, None
+
+    def release(self):
+        self.position = len(self.files)
+
+
+def open_source(source):
+    """Build a frame source from a camera index, a video file, an image directory or a source object."""
+    if isinstance(source, int):
+        return CameraSource(source)
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.isdir(source):
+            return ImageDirectorySource(source)
+        return VideoFileSource(os.fspath(source))
+    # Anything with read() -> (ret, frame, timestamp) and release()
+    return source
+
+
+class CaptureThread:
+    """Reads frames on a dedicated thread into a bounded drop-oldest buffer.
+
+    Slow inference never blocks capture: when the buffer is full the oldest
+    frame is thrown away (and counted in dropped_frames), so the consumer
+    always gets the freshest frames.
+
+    With drop_frames=False (recorded videos) the reader waits for free buffer
+    space instead, every frame is kept and decoding still overlaps inference.
+    """
+
+    def __init__(self, source, buffer_size=1, drop_frames=True):
+        self.source = open_source(source)
+        self.drop_frames = drop_frames
+        self.buffer = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.frame_index = 0
+        self.dropped_frames = 0
+        self.finished = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._reader, name="capture", daemon=True)
+        self.thread.start()
+        return self
+
+    def _reader(self):
+        while self.running:
+            ret, frame, timestamp = self.source.read()
+            if not ret:
+                break
+            with self.condition:
+                if not self.drop_frames:
+                    self.condition.wait_for(lambda: len(self.buffer) < self.buffer.maxlen or not self.running)
+                    if not self.running:
+                        break
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.dropped_frames += 1
+                self.frame_index += 1
+                self.buffer.append((self.frame_index, timestamp, frame))
+                self.condition.notify()
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def read(self, timeout=None):
+        """Return the oldest buffered frame as (frame_index, timestamp, frame).
+
+        Returns None when the source has ended or the timeout expired
+        (check self.finished to tell them apart).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.buffer or self.finished, timeout)
+            if not self.buffer:
+                return None
+            item = self.buffer.popleft()
+            # wake the reader if it waits for space (drop_frames=False)
+            self.condition.notify_all()
+            return item
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.source.release()
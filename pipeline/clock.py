@@ -0,0 +1,21 @@
+class ManualClock:
+    """Clock that only moves when told to, for replaying frames or testing the
+    detectors' timer logic deterministically.
+
+        clock = ManualClock()
+        detector = FaceDetector(clock=clock)
+        clock.advance(3.5)
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+    def set(self, timestamp):
+        self.now = float(timestamp)
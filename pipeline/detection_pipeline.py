@@ -1,26 +1,232 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from .frame_context import FrameContext
+from . import metrics as pipeline_metrics
+
+
 class DetectionPipeline:
-    def __init__(self, detectors, frame_skip=2):
+    def __init__(self, detectors, frame_skip=2, landmark_stage=None, parallel=False, max_workers=None, timeout=None,
+                 scheduler=None, metrics=None, clock=None):
         """
         detectors: list of detector objects [FaceDetector(), HandDetector(), EyeDetector()]
-        frame_skip: how many frames to skip (2 = process every 2nd frame)
+        frame_skip: how many frames to skip (2 = process every 2nd frame), multiplies
+                    each detector's own run_interval
+        landmark_stage: optional LandmarkStage, runs face mesh once per frame and
+                        shares the result with every landmark based detector
+        parallel: run the detectors at the same time in a thread pool
+                  (OpenCV, MediaPipe and torch release the GIL while they work)
+        max_workers: thread pool size for parallel mode (default: one thread per detector)
+        timeout: seconds to wait for a detector in parallel mode, one value for all
+                 detectors or a dict {detector class name: seconds}
+        scheduler: optional AdaptiveScheduler, replaces frame_skip with a per-detector
+                   cadence driven by measured latencies
+        metrics: MetricsRegistry for the frame / detector / stage timings
+                 (default: the process wide pipeline.metrics.registry)
+        clock: callable returning seconds, timestamps frames that come without one
+               (default time.time; e.g. a ManualClock for deterministic replays)
+
+        Every detector runs every detector.run_interval * frame_skip frames. In between
+        the cached result of its last run is returned, so each call gives a complete
+        result dict; every entry carries frame_index / timestamp of the run it came from
+        plus age_frames, age_seconds and stale.
         """
         self.detectors = detectors
         self.frame_skip = frame_skip
         self.frame_counter = 0
+        self.landmark_stage = landmark_stage
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.metrics = metrics if metrics is not None else pipeline_metrics.registry
+        self.clock = clock or time.time
+        # detector name -> {"result", "frame_index", "timestamp"} of its last run
+        self.cache = {}
 
-    def run(self, frame):
-        """Run all detectors on a given frame"""
-        self.frame_counter += 1
+        if scheduler is not None:
+            for detector in detectors:
+                scheduler.register(type(detector).__name__, getattr(detector, "run_interval", 1))
+
+        self.executor = None
+        if parallel:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers or max(len(detectors), 1),
+                thread_name_prefix="detector"
+            )
+        # detector name -> (future, frame_index, timestamp) of a run that was still going when it timed out
+        self._pending = {}
 
-        # Frame skipping for performance
-        if self.frame_counter % self.frame_skip != 0:
-            return None  # Skip this frame
+    def run(self, frame, timestamp=None, precomputed=None):
+        """Run the due detectors on a given frame and return the latest result of every detector
+
+        precomputed: optional {detector name: (result, seconds)} for detectors that were
+                     already run outside the pipeline for this frame (e.g. a batched
+                     ObjectDetector.detect_batch over many sessions)
+        """
+        run_start = time.perf_counter()
+        if timestamp is None:
+            timestamp = self.clock()
+        precomputed = precomputed or {}
+
+        # Runs that timed out earlier and finished since then, their result is the latest one
+        self._collect_pending(frame)
+
+        due = [detector for detector in self.detectors
+               if type(detector).__name__ not in precomputed and self.is_due(detector)]
+        self.frame_counter += 1
 
         results = {}
-        for detector in self.detectors:
+        context = FrameContext(frame, self.frame_counter, timestamp)
+        landmark_time = 0.0
+        if self.landmark_stage is not None and any(getattr(d, "uses_landmarks", False) for d in due):
+            start = time.perf_counter()
             try:
-                results[type(detector).__name__] = detector.detect(frame)
+                context.landmarks = self.landmark_stage.process(frame)
+                context.landmarks_computed = True
             except Exception as e:
-                results[type(detector).__name__] = {"error": str(e)}
+                # Detectors fall back to their own face mesh
+                results[type(self.landmark_stage).__name__] = {"error": str(e)}
+            landmark_time = time.perf_counter() - start
+
+        if self.executor is None:
+            fresh, timings = {}, {}
+            for detector in due:
+                name = type(detector).__name__
+                fresh[name], timings[name] = self._detect(detector, frame, context)
+        else:
+            fresh, timings = self._run_parallel(due, frame, context)
+        for name, (result, seconds) in precomputed.items():
+            fresh[name], timings[name] = result, seconds
+
+        for name, result in fresh.items():
+            self._store(name, result, self.frame_counter, timestamp, frame)
+
+        if self.scheduler is not None:
+            ran = [detector for detector in self.detectors if type(detector).__name__ in timings]
+            self._record_timings(ran, timings, landmark_time)
+        if self.metrics.enabled:
+            self._record_metrics(context, results, fresh, timings, landmark_time, time.perf_counter() - run_start)
+
+        for detector in self.detectors:
+            name = type(detector).__name__
+            entry = self.cache.get(name)
+            if entry is None:
+                results[name] = None
+                continue
+            age_frames = self.frame_counter - entry["frame_index"]
+            results[name] = dict(
+                entry["result"],
+                frame_index=entry["frame_index"],
+                timestamp=entry["timestamp"],
+                age_frames=age_frames,
+                age_seconds=timestamp - entry["timestamp"],
+                stale=age_frames > 0
+            )
 
         return results
+
+    def _store(self, name, result, frame_index, timestamp, frame):
+        self.cache[name] = {"result": result, "frame_index": frame_index, "timestamp": timestamp}
+        # A person box (ObjectDetector) tells the landmark stage where to look for a lost face
+        if self.landmark_stage is not None and result.get("person_box") is not None:
+            self.landmark_stage.set_person_box(result["person_box"], frame.shape[1], frame.shape[0])
+
+    def _collect_pending(self, frame):
+        for name, (future, frame_index, timestamp) in list(self._pending.items()):
+            if future.done():
+                del self._pending[name]
+                result, _ = future.result()
+                # It already updated the detector's timer state, so it is kept with the frame it ran on
+                self._store(name, result, frame_index, timestamp, frame)
+
+    def is_due(self, detector):
+        """True when the detector has to run on the next call of run()"""
+        name = type(detector).__name__
+        frame_index = self.frame_counter + 1
+        if self.scheduler is not None:
+            return self.scheduler.should_run(name, frame_index)
+        entry = self.cache.get(name)
+        if entry is None:
+            return True
+        interval = getattr(detector, "run_interval", 1) * self.frame_skip
+        return frame_index - entry["frame_index"] >= interval
+
+    def _detect(self, detector, frame, context):
+        """Run one detector, returns (result, seconds)"""
+        start = time.perf_counter()
+        try:
+            result = detector.detect(frame, context)
+        except Exception as e:
+            result = {"error": str(e)}
+        return result, time.perf_counter() - start
+
+    def _run_parallel(self, detectors, frame, context):
+        """Run the detectors concurrently, results keep the order of detectors"""
+        futures = {}
+        for detector in detectors:
+            name = type(detector).__name__
+            # Detectors keep timer state, so never run the same one twice at once. A busy
+            # detector gets no new result, its cached one just gets older
+            if name not in self._pending:
+                futures[name] = self.executor.submit(self._detect, detector, frame, context)
+
+        results, timings = {}, {}
+        start = time.perf_counter()
+        for detector in detectors:
+            name = type(detector).__name__
+            if name not in futures:
+                continue
+
+            timeout = self._get_timeout(name)
+            remaining = None
+            if timeout is not None:
+                remaining = max(timeout - (time.perf_counter() - start), 0)
+            try:
+                results[name], timings[name] = futures[name].result(timeout=remaining)
+            except FutureTimeout:
+                # The result is picked up by a later run() once it is there
+                self._pending[name] = (futures[name], context.frame_index, context.timestamp)
+                timings[name] = timeout
+                self.metrics.increment("detection_errors_total", detector=name)
+
+        return results, timings
+
+    def _record_timings(self, detectors, timings, landmark_time):
+        # The shared face mesh cost is split between the landmark detectors that used it
+        landmark_users = [d for d in detectors if getattr(d, "uses_landmarks", False)]
+        landmark_share = landmark_time / len(landmark_users) if landmark_users else 0.0
+        for detector in detectors:
+            name = type(detector).__name__
+            if name not in timings:
+                continue
+            seconds = timings[name]
+            if getattr(detector, "uses_landmarks", False):
+                seconds += landmark_share
+            self.scheduler.record(name, self.frame_counter, seconds)
+        self.scheduler.end_frame()
+
+    def _record_metrics(self, context, results, fresh, timings, landmark_time, frame_time):
+        metrics = self.metrics
+        metrics.observe("detection_frame_seconds", frame_time)
+        metrics.increment("detection_frames_total")
+        if context.landmarks_computed:
+            metrics.observe("detection_detector_seconds", landmark_time, detector=type(self.landmark_stage).__name__)
+        for name, seconds in timings.items():
+            metrics.observe("detection_detector_seconds", seconds, detector=name)
+        for name, result in fresh.items():
+            if "error" in result:
+                metrics.increment("detection_errors_total", detector=name)
+        if self.landmark_stage is not None and type(self.landmark_stage).__name__ in results:
+            metrics.increment("detection_errors_total", detector=type(self.landmark_stage).__name__)
+        for detector, stage, seconds in context.stage_timings:
+            metrics.observe("detection_stage_seconds", seconds, detector=detector, stage=stage)
+
+    def _get_timeout(self, name):
+        if isinstance(self.timeout, dict):
+            return self.timeout.get(name)
+        return self.timeout
+
+    def close(self):
+        """Stop the worker threads of parallel mode"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,37 @@
+import time
+
+
+class FrameContext:
+    """Per-frame data shared between the detectors of one pipeline run."""
+
+    def __init__(self, frame, frame_index=0, timestamp=None):
+        self.frame = frame
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+        # (N, 3) landmark array from the shared LandmarkStage (None = no face found)
+        self.landmarks = None
+        # False when the pipeline has no landmark stage, detectors then run their own
+        self.landmarks_computed = False
+        # (detector name, stage, seconds) recorded by the detectors, see stage()
+        self.stage_timings = []
+
+    def stage(self, detector, stage):
+        """with context.stage("FaceDetector", "inference"): ... records how long the block took"""
+        return _StageTimer(self.stage_timings, detector, stage)
+
+
+class _StageTimer:
+    __slots__ = ("timings", "detector", "stage", "start")
+
+    def __init__(self, timings, detector, stage):
+        self.timings = timings
+        self.detector = detector
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.append((self.detector, self.stage, time.perf_counter() - self.start))
+
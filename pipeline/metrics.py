@@ -0,0 +1,221 @@
+import bisect
+import threading
+
+
+# Upper bounds in seconds, from sub-millisecond post-processing up to a slow YOLO pass
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Fixed-bucket histogram, observe() is a bisect and three additions."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one count per bucket plus the +Inf bucket, not cumulative
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket the q-quantile falls into (None without observations)"""
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def drain(self):
+        """(counts, sum, count) observed since the last drain, which are reset"""
+        with self.lock:
+            delta = (self.counts, self.sum, self.count)
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+        return delta
+
+    def merge(self, counts, total, count):
+        with self.lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], counts)),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def increment(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def drain(self):
+        with self.lock:
+            value, self.value = self.value, 0
+        return value
+
+
+class MetricsRegistry:
+    """Named, labelled histograms and counters.
+
+    In process: snapshot() returns a dict of everything recorded so far.
+    For scraping: to_prometheus() renders the Prometheus text format.
+    Across processes: drain() in the worker, merge() of its output in the parent.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        # (name, sorted label items) -> Histogram / Counter
+        self.histograms = {}
+        self.counters = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.counters.get(key)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(key, Counter())
+        counter.increment(amount)
+
+    def drain(self):
+        """Picklable delta of everything recorded since the last drain(), None when there is nothing.
+
+        The recorded values are reset, so every observation is sent to merge() once.
+        """
+        with self.lock:
+            histograms, counters = list(self.histograms.items()), list(self.counters.items())
+        delta = {
+            "histograms": [(key, *histogram.drain()) for key, histogram in histograms],
+            "counters": [(key, counter.drain()) for key, counter in counters],
+        }
+        delta["histograms"] = [item for item in delta["histograms"] if item[3]]
+        delta["counters"] = [item for item in delta["counters"] if item[1]]
+        if not delta["histograms"] and not delta["counters"]:
+            return None
+        return delta
+
+    def merge(self, delta):
+        """Add another registry's drain() (e.g. of an inference worker) to this one"""
+        if not self.enabled:
+            return
+        for key, counts, total, count in delta["histograms"]:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                with self.lock:
+                    histogram = self.histograms.setdefault(key, Histogram(self.buckets))
+            histogram.merge(counts, total, count)
+        for (name, labels), value in delta["counters"]:
+            self.increment(name, value, **dict(labels))
+
+    def snapshot(self):
+        """{"histograms": {name: [{"labels", stats...}]}, "counters": {name: [{"labels", "value"}]}}"""
+        with self.lock:
+            histograms, counters = list(self.histograms.items()), list(self.counters.items())
+        result = {"histograms": {}, "counters": {}}
+        for (name, labels), histogram in histograms:
+            result["histograms"].setdefault(name, []).append(dict(histogram.snapshot(), labels=dict(labels)))
+        for (name, labels), counter in counters:
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": counter.value})
+        return result
+
+    def to_prometheus(self):
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            counters = sorted(self.counters.items(), key=lambda item: item[0])
+
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            with histogram.lock:
+                counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+            cumulative = 0
+            for bound, bucket_count in zip([*map(repr, histogram.buckets), "+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for (name, labels), counter in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {counter.value}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+def _labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Shared by every pipeline of the process unless one is given its own
+registry = MetricsRegistry()
+registry.describe("detection_frame_seconds", "Duration of DetectionPipeline.run")
+registry.describe("detection_detector_seconds", "Duration of one detector (or the landmark stage) per frame")
+registry.describe("detection_stage_seconds", "Duration of a detector stage: preprocess, inference, postprocess, state_update")
+registry.describe("detection_frames_total", "Frames run through a DetectionPipeline")
+registry.describe("detection_errors_total", "Detector runs that raised or timed out")
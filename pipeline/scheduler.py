@@ -0,0 +1,99 @@
+class AdaptiveScheduler:
+    """Decides how often each detector runs so the frame cost stays inside a latency budget.
+
+    Every detector gets its own interval (run every N frames, reuse the last
+    result in between). Measured latencies are smoothed with an exponential
+    moving average and every few frames the intervals are adjusted: when the
+    average cost per frame (sum of latency / interval) is over budget the
+    detector with the biggest share runs less often, when there is room
+    again the cheapest detector that still fits runs more often.
+    """
+
+    def __init__(self, target_fps=None, target_latency=None, min_intervals=None, max_intervals=None,
+                 default_max_interval=10, smoothing=0.2, adjust_every=10, headroom=0.8):
+        """
+        target_fps / target_latency: the budget, as frames per second or seconds per frame
+        min_intervals / max_intervals: {detector name: frames} limits, e.g. {"GazeDetector": 1}
+                                      in max_intervals pins gaze to every frame
+        default_max_interval: upper limit for detectors not listed in max_intervals
+        smoothing: weight of the newest latency sample in the moving average
+        adjust_every: how many frames between two interval changes
+        headroom: fraction of the budget an interval decrease may use (avoids oscillating)
+        """
+        if target_latency is None:
+            if target_fps is None:
+                raise ValueError("target_fps or target_latency is required")
+            target_latency = 1.0 / target_fps
+        self.budget = target_latency
+        self.min_intervals = min_intervals or {}
+        self.max_intervals = max_intervals or {}
+        self.default_max_interval = default_max_interval
+        self.smoothing = smoothing
+        self.adjust_every = adjust_every
+        self.headroom = headroom
+
+        self.intervals = {}
+        self.latencies = {}
+        self.last_run = {}
+        self.frames_since_adjust = 0
+
+    def get_min_interval(self, name):
+        return self.min_intervals.get(name, 1)
+
+    def get_max_interval(self, name):
+        return max(self.max_intervals.get(name, self.default_max_interval), self.get_min_interval(name))
+
+    def get_interval(self, name):
+        return self.intervals.get(name, self.get_min_interval(name))
+
+    def register(self, name, interval=1):
+        """Start a detector at its own declared run interval (clamped to the limits)"""
+        interval = max(self.get_min_interval(name), min(interval, self.get_max_interval(name)))
+        self.intervals.setdefault(name, interval)
+
+    def should_run(self, name, frame_index):
+        """True when the detector is due on this frame"""
+        last = self.last_run.get(name)
+        if last is None:
+            return True
+        return frame_index - last >= self.get_interval(name)
+
+    def record(self, name, frame_index, seconds):
+        """Store the measured latency of a detector run"""
+        self.last_run[name] = frame_index
+        self.intervals.setdefault(name, self.get_min_interval(name))
+        if name in self.latencies:
+            self.latencies[name] += self.smoothing * (seconds - self.latencies[name])
+        else:
+            self.latencies[name] = seconds
+
+    def end_frame(self):
+        """Called once per frame, adjusts the intervals every adjust_every frames"""
+        self.frames_since_adjust += 1
+        if self.frames_since_adjust >= self.adjust_every:
+            self.frames_since_adjust = 0
+            self.adjust()
+
+    def frame_cost(self):
+        """Estimated average detector time per frame in seconds"""
+        return sum(latency / self.intervals[name] for name, latency in self.latencies.items())
+
+    def adjust(self):
+        cost = self.frame_cost()
+        if cost > self.budget:
+            # Over budget: slow down the detector with the biggest share of the cost
+            candidates = [name for name in self.latencies if self.intervals[name] < self.get_max_interval(name)]
+            if candidates:
+                name = max(candidates, key=lambda n: self.latencies[n] / self.intervals[n])
+                self.intervals[name] += 1
+            return
+
+        # Under budget: speed up the cheapest detector that still fits
+        candidates = [name for name in self.latencies if self.intervals[name] > self.get_min_interval(name)]
+        for name in sorted(candidates, key=lambda n: self.latencies[n]):
+            interval = self.intervals[name]
+            latency = self.latencies[name]
+            new_cost = cost - latency / interval + latency / (interval - 1)
+            if new_cost <= self.budget * self.headroom:
+                self.intervals[name] = interval - 1
+                return
@@ -0,0 +1,366 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from detectors.calibration import GazeCalibration, SQLiteBaselineStore
+from detectors.face_detector import FaceDetector
+from detectors.gaze_detector import GazeDetector
+from detectors.landmarks import LandmarkStage
+from detectors.model_registry import create_face_mesh
+from detectors.object_detector import ObjectDetector
+from detectors.roi import FaceRoiTracker
+from pipeline.detection_pipeline import DetectionPipeline
+from services.screenshot_service import ScreenshotService
+from services.violation_service import ViolationEventTracker
+
+
+logger = logging.getLogger(__name__)
+
+class CapacityError(RuntimeError):
+    """Raised when a new session would push the process over its measured capacity."""
+
+
+class DetectionSession:
+    """One candidate stream with its own detectors, so timers, gaze calibration
+    and gaze_history never leak between candidates."""
+
+    def __init__(self, session_id, pipeline, student_id=None, buffer_size=1, screenshots=None, clock=None):
+        self.session_id = session_id
+        self.student_id = student_id
+        self.pipeline = pipeline
+        # latest (frame, timestamp, future) waiting for processing, the oldest is dropped when full
+        self.frames = deque(maxlen=buffer_size)
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.last_result = None
+        # start/end events of violations, last_events are the ones of the latest frame
+        self.violations = ViolationEventTracker(session_id, student_id, clock=clock)
+        self.last_events = []
+        # optional ScreenshotService, evidence is saved when a violation starts
+        self.screenshots = screenshots
+        # one frame at a time per session, detectors keep temporal state
+        self.lock = threading.Lock()
+        # a frame of this session is being processed, it sits out rounds until it is done
+        self.busy = False
+
+    def run(self, frame, timestamp, precomputed=None):
+        """Run the pipeline on one frame, the caller holds self.lock"""
+        self.last_result = self.pipeline.run(frame, timestamp, precomputed=precomputed)
+        self.last_events = self.violations.update(self.last_result, timestamp)
+        if self.screenshots is not None:
+            for event in self.last_events:
+                if event["event"] == "start":
+                    self.screenshots.capture(frame, event)
+        self.processed_frames += 1
+        return self.last_result
+
+    def get_detector(self, detector_type):
+        for detector in self.pipeline.detectors:
+            if isinstance(detector, detector_type):
+                return detector
+        return None
+
+
+def _drop_frame(future):
+    """Resolve the future of a frame that will never be processed, unless its caller cancelled it"""
+    if future.set_running_or_notify_cancel():
+        future.set_result(None)
+
+
+def _drop_frames(session):
+    while session.frames:
+        _drop_frame(session.frames.popleft()[2])
+
+
+class SessionManager:
+    """Hosts many candidate streams in one process.
+
+    Model instances are shared: every ObjectDetector with the same backend
+    settings uses the same model (see detectors.model_registry) and one face
+    mesh graph serves every session (in static image mode,
+    so tracking state of one stream never bleeds into another; each session
+    has its own FaceRoiTracker to keep the face mesh input small). Detector
+    state stays per session.
+
+    Frames are processed round robin, one frame per session per round, and the
+    ObjectDetector passes of a round are batched into one forward pass. The
+    rest of each session's frame runs on a small thread pool; the next round
+    does not wait for it, so one slow session does not hold up the others.
+    Admission control uses the measured processing time per frame.
+    """
+
+    def __init__(self, target_fps=5, max_sessions=None, initial_capacity=8, batch_size=16,
+                 on_result=None, object_detector_kwargs=None, screenshot_dir=None, clock=None,
+                 baseline_path=None, calibration_kwargs=None, threads=4):
+        """
+        target_fps: frames per second every session should get processed at
+        max_sessions: hard limit on sessions, regardless of measured capacity
+        initial_capacity: number of sessions admitted before there are measurements
+        batch_size: most sessions processed (and batched through YOLO) in one round
+        on_result: optional callback(session, results) after each processed frame
+        object_detector_kwargs: arguments for every session's ObjectDetector
+        screenshot_dir: save evidence screenshots under this directory, None = no screenshots
+        clock: callable returning seconds, timestamps frames submitted without one (default time.time)
+        baseline_path: SQLite database of per-student gaze baselines, reconnecting students skip
+                       the calibration warm-up; None = always calibrate
+        calibration_kwargs: arguments for every session's GazeCalibration (recalibration settings)
+        threads: sessions whose frames are processed at the same time by the background loop
+        """
+        self.target_fps = target_fps
+        self.max_sessions = max_sessions
+        self.initial_capacity = initial_capacity
+        self.batch_size = batch_size
+        self.on_result = on_result
+        self.object_detector_kwargs = object_detector_kwargs or {}
+        self.screenshots = ScreenshotService(screenshot_dir) if screenshot_dir else None
+        self.clock = clock or time.time
+        self.baselines = SQLiteBaselineStore(baseline_path) if baseline_path else None
+        self.calibration_kwargs = calibration_kwargs or {}
+
+        self.face_mesh = create_face_mesh(static_image_mode=True)
+        # sessions may be processed from several threads (see process_frame)
+        self.face_mesh_lock = threading.Lock()
+        self.sessions = {}
+        self.order = deque()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+        # moving average of processing seconds per session frame
+        self.frame_cost = None
+        self.smoothing = 0.1
+
+        self.running = False
+        self.thread = None
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="session")
+
+    # Sessions
+
+    def capacity(self):
+        """How many sessions this process can serve at target_fps"""
+        if self.frame_cost is None or self.frame_cost <= 0:
+            capacity = self.initial_capacity
+        else:
+            capacity = int(1.0 / (self.frame_cost * self.target_fps))
+        if self.max_sessions is not None:
+            capacity = min(capacity, self.max_sessions)
+        return capacity
+
+    def can_admit(self):
+        return len(self.sessions) < self.capacity()
+
+    def open_session(self, session_id, student_id=None):
+        """Create a session, raises CapacityError when the process is full"""
+        with self.lock:
+            if session_id in self.sessions:
+                return self.sessions[session_id]
+            if not self.can_admit():
+                raise CapacityError(f"capacity of {self.capacity()} sessions reached")
+
+            landmark_stage = LandmarkStage(
+                face_mesh=self.face_mesh,
+                roi_tracker=FaceRoiTracker(),
+                face_mesh_lock=self.face_mesh_lock
+            )
+            pipeline = DetectionPipeline(
+                detectors=[
+                    FaceDetector(clock=self.clock),
+                    ObjectDetector(clock=self.clock, **self.object_detector_kwargs),
+                    GazeDetector(clock=self.clock, calibration=self._calibration(student_id))
+                ],
+                frame_skip=1,
+                landmark_stage=landmark_stage,
+                clock=self.clock
+            )
+            session = DetectionSession(session_id, pipeline, student_id=student_id, screenshots=self.screenshots,
+                                       clock=self.clock)
+            self.sessions[session_id] = session
+            self.order.append(session_id)
+            return session
+
+    def _calibration(self, student_id):
+        """Gaze calibration of a new session, restored from and saved to the baseline store"""
+        if self.baselines is None or student_id is None:
+            return GazeCalibration(**self.calibration_kwargs)
+        return GazeCalibration(
+            baseline=self.baselines.get(student_id),
+            on_calibrated=lambda baseline: self.baselines.put(student_id, baseline),
+            **self.calibration_kwargs
+        )
+
+    def close_session(self, session_id):
+        """Remove a session, its ongoing violations are ended in session.last_events"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.order.remove(session_id)
+                _drop_frames(session)
+        if session is not None:
+            with session.lock:
+                session.last_events = session.violations.flush()
+            if self.screenshots is not None:
+                self.screenshots.forget_session(session_id)
+        return session
+
+    def submit(self, session_id, frame, timestamp=None):
+        """Queue the newest frame of a session, the oldest waiting frame is dropped.
+
+        Returns a Future with (detector results, violation events) once a round
+        of the processing loop has run the frame, or None if it was dropped.
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        future = Future()
+        with self.condition:
+            session = self.sessions[session_id]
+            if len(session.frames) == session.frames.maxlen:
+                session.dropped_frames += 1
+                _drop_frame(session.frames.popleft()[2])
+            session.frames.append((frame, timestamp, future))
+            self.condition.notify()
+        return future
+
+    # Processing
+
+    def _next_round(self):
+        """Pop one frame from up to batch_size sessions, fairly in round robin order"""
+        batch = []
+        for _ in range(len(self.order)):
+            session_id = self.order[0]
+            self.order.rotate(-1)
+            session = self.sessions[session_id]
+            if session.busy:
+                continue
+            while session.frames:
+                frame, timestamp, future = session.frames.popleft()
+                # Once running the future can no longer be cancelled, a cancelled one is skipped
+                if future.set_running_or_notify_cancel():
+                    session.busy = True
+                    batch.append((session, frame, timestamp, future))
+                    break
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def step(self):
+        """Start one round, returns the number of frames taken.
+
+        The batched YOLO pass runs on the calling thread, the sessions' frames
+        are then finished on the thread pool without waiting for them.
+        """
+        with self.lock:
+            batch = self._next_round()
+        if not batch:
+            return 0
+
+        # All due ObjectDetector passes of this round go through YOLO together
+        precomputed = [{} for _ in batch]
+        object_jobs = []
+        for i, (session, frame, _, _) in enumerate(batch):
+            detector = session.get_detector(ObjectDetector)
+            if detector is not None and session.pipeline.is_due(detector):
+                object_jobs.append((i, detector, frame))
+        object_seconds = [0.0] * len(batch)
+        if object_jobs:
+            object_start = time.perf_counter()
+            try:
+                outputs = ObjectDetector.detect_batch(
+                    [detector for _, detector, _ in object_jobs],
+                    [frame for _, _, frame in object_jobs],
+                    batch_size=self.batch_size,
+                    timestamps=[batch[i][2] for i, _, _ in object_jobs]
+                )
+            except Exception as e:
+                outputs = [{"error": str(e)}] * len(object_jobs)
+            seconds = (time.perf_counter() - object_start) / len(object_jobs)
+            for (i, detector, _), output in zip(object_jobs, outputs):
+                precomputed[i][type(detector).__name__] = (output, seconds)
+                object_seconds[i] = seconds
+
+        for (session, frame, timestamp, future), extra, seconds in zip(batch, precomputed, object_seconds):
+            self.executor.submit(self._run, session, frame, timestamp, future, extra, seconds)
+        return len(batch)
+
+    def _run(self, session, frame, timestamp, future, precomputed, object_seconds):
+        """Thread pool job: the rest of a session's frame after the batched YOLO pass"""
+        start = time.perf_counter()
+        try:
+            with session.lock:
+                session.run(frame, timestamp, precomputed=precomputed)
+                outcome = (session.last_result, session.last_events)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(outcome)
+            if self.on_result is not None:
+                try:
+                    self.on_result(session, session.last_result)
+                except Exception:
+                    # the loop serves every session, one failing callback must not stop it
+                    logger.exception("on_result callback failed for session %s", session.session_id)
+            # The first frame of a session includes model warm-up, keep it out of the capacity estimate
+            if session.processed_frames > 1:
+                self._record_cost(time.perf_counter() - start + object_seconds)
+        finally:
+            with self.condition:
+                session.busy = False
+                # its next frame can go into a round now
+                self.condition.notify()
+
+    def process_frame(self, session_id, frame, timestamp=None):
+        """Run one frame of a session right away on the calling thread.
+
+        For callers that process one session at a time (e.g. an inference worker),
+        skips the round robin batching of submit() / step(); the shared models are
+        locked so sessions can still run on different threads.
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        session = self.sessions[session_id]
+        start = time.perf_counter()
+        with session.lock:
+            session.run(frame, timestamp)
+        if session.processed_frames > 1:
+            self._record_cost(time.perf_counter() - start)
+        return session.last_result
+
+    def _record_cost(self, cost):
+        with self.lock:
+            if self.frame_cost is None:
+                self.frame_cost = cost
+            else:
+                self.frame_cost += self.smoothing * (cost - self.frame_cost)
+
+    def _loop(self):
+        while self.running:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: not self.running or any(s.frames and not s.busy for s in self.sessions.values()),
+                    timeout=0.5
+                )
+            if self.running:
+                self.step()
+
+    def start(self):
+        """Process frames on a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="session-manager", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        # frames already taken by a round are finished
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for session in self.sessions.values():
+                _drop_frames(session)
+        if self.screenshots is not None:
+            self.screenshots.close()
+        if self.baselines is not None:
+            self.baselines.close()
@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+SCREENSHOT_DIR = os.path.join("storage", "screenshots")
+
+
+def safe_name(value):
+    """Path component of a session / student id, ids come from clients"""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", str(value))
+
+
+def screenshot_dir(root, session_id, student_id):
+    return os.path.join(root, f"session_{safe_name(session_id)}", f"student_{safe_name(student_id)}")
+
+
+class ScreenshotService:
+    """Saves evidence frames when a violation starts.
+
+    capture() runs on the detection thread and only does cheap checks (rate
+    limit, free queue space) and a copy of the frame. JPEG encoding, the
+    duplicate check and the disk write happen on a small worker pool. When
+    max_pending screenshots are already waiting, new ones are dropped and
+    counted, so evidence never slows detection down.
+
+    Files go to {root}/session_{id}/student_{id}/violation_{N}.jpg.
+    """
+
+    def __init__(self, root=SCREENSHOT_DIR, max_workers=2, max_pending=16, min_interval=2.0,
+                 jpeg_quality=80, duplicate_threshold=3.0):
+        """
+        root: directory the session folders are created in
+        max_workers: encoding / writing threads
+        max_pending: screenshots waiting for a worker before new ones are dropped
+        min_interval: least seconds between two screenshots of one session
+        jpeg_quality: cv2.IMWRITE_JPEG_QUALITY of the saved files
+        duplicate_threshold: mean absolute difference (0-255) of the 32x32 thumbnails
+                             below which a frame counts as the same as the last saved one
+        """
+        self.root = root
+        self.min_interval = min_interval
+        self.jpeg_quality = jpeg_quality
+        self.duplicate_threshold = duplicate_threshold
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screenshots")
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        # session_id -> timestamp of the last accepted screenshot / thumbnail of the last saved one
+        self.last_capture = {}
+        self.last_thumbnail = {}
+        # (session_id, student_id) -> number of the last saved violation_N.jpg
+        self.counters = {}
+        self.saved = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    def capture(self, frame, event):
+        """Queue a screenshot for a violation event, returns the Future or None when skipped"""
+        session_id = event.get("session_id")
+        timestamp = event.get("timestamp")
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            last = self.last_capture.get(session_id)
+            if last is not None and timestamp - last < self.min_interval:
+                return None
+            if not self.pending.acquire(blocking=False):
+                self.dropped += 1
+                return None
+            self.last_capture[session_id] = timestamp
+
+        # The caller may reuse the frame buffer (capture thread, shared memory slot)
+        frame = frame.copy()
+        try:
+            future = self.executor.submit(self._save, frame, event)
+        except RuntimeError:
+            # shut down
+            self.pending.release()
+            return None
+        future.add_done_callback(lambda _: self.pending.release())
+        return future
+
+    def _save(self, frame, event):
+        """Worker job: skip duplicates, encode and write, returns the path or None"""
+        session_id, student_id = event.get("session_id"), event.get("student_id")
+        directory = screenshot_dir(self.root, session_id, student_id)
+        thumbnail = cv2.resize(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame,
+            (32, 32), interpolation=cv2.INTER_AREA
+        ).astype(np.int16)
+
+        with self.lock:
+            previous = self.last_thumbnail.get(session_id)
+            if previous is not None and np.abs(thumbnail - previous).mean() < self.duplicate_threshold:
+                self.duplicates += 1
+                return None
+            self.last_thumbnail[session_id] = thumbnail
+            key = (session_id, student_id)
+            if key not in self.counters:
+                self.counters[key] = self._existing_count(directory)
+            self.counters[key] += 1
+            number = self.counters[key]
+
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"violation_{number}.jpg")
+        with open(path, "wb") as f:
+            f.write(encoded.tobytes())
+        with self.lock:
+            self.saved += 1
+        return path
+
+    @staticmethod
+    def _existing_count(directory):
+        # Continue numbering after a restart instead of overwriting evidence
+        if not os.path.isdir(directory):
+            return 0
+        numbers = [int(m.group(1)) for m in map(re.compile(r"violation_(\d+)\.jpg$").match, os.listdir(directory)) if m]
+        return max(numbers, default=0)
+
+    def forget_session(self, session_id):
+        with self.lock:
+            self.last_capture.pop(session_id, None)
+            self.last_thumbnail.pop(session_id, None)
+            for key in [key for key in self.counters if key[0] == session_id]:
+                del self.counters[key]
+
+    def close(self, wait=True):
+        """Stop accepting screenshots, by default after the queued ones are written"""
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,89 @@
+import time
+
+
+# Detector name -> [(violation type, result key that is True while it is going on,
+#                    result key of the time the behaviour started, before the alert threshold passed)]
+VIOLATION_SOURCES = {
+    "FaceDetector": [("head_pose", "cheating", "cheating_start_time")],
+    "GazeDetector": [("gaze", "cheating", "cheating_start_time")],
+    "ObjectDetector": [("no_person", "no_person_alert", "no_person_start_time"),
+                       ("object", "object_alert", "no_object_start_time")],
+}
+
+
+class ViolationEventTracker:
+    """Turns per-frame detector results into compact violation events.
+
+    The detectors keep reporting their state on every frame, this only emits
+    something when a violation starts or ends, e.g.
+
+        {"event": "start", "type": "gaze", "direction": "Left", "timestamp": ...}
+        {"event": "end", "type": "gaze", "direction": "Left", "timestamp": ..., "duration": 4.2}
+
+    so whatever stores or broadcasts violations scales with the number of
+    violations, not the number of frames.
+    """
+
+    def __init__(self, session_id=None, student_id=None, clock=None):
+        self.session_id = session_id
+        self.student_id = student_id
+        # time of events that are not given a timestamp (default time.time)
+        self.clock = clock or time.time
+        # violation type -> start event of the violation that is going on
+        self.active = {}
+
+    def update(self, results, timestamp=None):
+        """Feed one DetectionPipeline.run() output, returns the new events (usually none)"""
+        if timestamp is None:
+            timestamp = self.clock()
+
+        events = []
+        for name, result in results.items():
+            sources = VIOLATION_SOURCES.get(name)
+            if sources is None or not result or "error" in result:
+                continue
+            if result.get("stale"):
+                # cached results were already looked at on the frame they were computed
+                continue
+
+            for violation_type, flag, start_key in sources:
+                active = bool(result.get(flag))
+                current = self.active.get(violation_type)
+                if active and current is None:
+                    # Stamped with when the behaviour started, so duration matches the detector's
+                    started = result.get(start_key)
+                    event = self._event("start", violation_type, timestamp if started is None else started,
+                                        direction=result.get("direction"),
+                                        confidence=result.get("confidence"))
+                    self.active[violation_type] = event
+                    events.append(event)
+                elif not active and current is not None:
+                    events.append(self._end(violation_type, timestamp))
+        return events
+
+    def flush(self, timestamp=None):
+        """End every violation that is still going on (session closed, end of video)"""
+        if timestamp is None:
+            timestamp = self.clock()
+        return [self._end(violation_type, timestamp) for violation_type in list(self.active)]
+
+    def _end(self, violation_type, timestamp):
+        start = self.active.pop(violation_type)
+        return self._event("end", violation_type, timestamp,
+                           direction=start["direction"],
+                           confidence=start["confidence"],
+                           duration=max(0.0, timestamp - start["timestamp"]))
+
+    def _event(self, event, violation_type, timestamp, direction=None, confidence=None, duration=None):
+        payload = {
+            "event": event,
+            "type": violation_type,
+            "direction": direction,
+            "timestamp": timestamp,
+            "confidence": confidence,
+            "session_id": self.session_id,
+            "student_id": self.student_id,
+        }
+        if duration is not None:
+            payload["duration"] = duration
+        return payload
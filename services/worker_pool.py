@@ -0,0 +1,322 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from pipeline.metrics import registry
+from services.detection_service import CapacityError
+
+# Imported once by the fork server, workers forked from it start without importing them again.
+# torchvision is imported by ultralytics only on the first prediction, which made that one take seconds
+PRELOAD_MODULES = ["mediapipe", "ultralytics", "torchvision", "services.detection_service"]
+
+# Seconds between the metrics a worker sends to the parent's registry
+METRICS_INTERVAL = 1.0
+
+
+def _default_start_method():
+    # No forkserver on Windows
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _worker_main(worker_id, shm_name, slot_bytes, tasks, results, manager_kwargs):
+    """Inference process: owns its own models and the detector state of its sessions"""
+    # Heavy imports (YOLO, mediapipe) happen here, in the worker only
+    from detectors.model_registry import prewarm
+    from services.detection_service import SessionManager
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    manager = SessionManager(**manager_kwargs)
+    # Models are loaded and have run once before the worker reports ready, the first frame is no latency spike
+    prewarm(object_detector_kwargs=manager_kwargs.get("object_detector_kwargs"))
+    results.send(("ready", worker_id, None, None))
+
+    def send_metrics():
+        delta = registry.drain()
+        if delta is not None:
+            results.send(("metrics", worker_id, None, delta))
+
+    metrics_sent = time.monotonic()
+    while True:
+        try:
+            task = tasks.get(timeout=METRICS_INTERVAL)
+        except queue.Empty:
+            # idle, only the metrics are due
+            task = ()
+        if time.monotonic() - metrics_sent >= METRICS_INTERVAL:
+            send_metrics()
+            metrics_sent = time.monotonic()
+        if task is None:
+            break
+        if not task:
+            continue
+
+        if task[0] == "open":
+            _, request_id, session_id, student_id = task
+            # Admission control with the worker's own measured capacity
+            try:
+                manager.open_session(session_id, student_id=student_id)
+                result = None
+            except CapacityError as e:
+                result = e
+            results.send((request_id, worker_id, None, result))
+            continue
+
+        if task[0] == "close":
+            _, request_id, session_id = task
+            session = manager.close_session(session_id)
+            # violations still going on are ended when the session closes
+            results.send((request_id, worker_id, None, session.last_events if session is not None else []))
+            continue
+
+        _, request_id, session_id, slot, shape, timestamp = task
+        # The frame is read straight from the shared memory slot, no unpickling
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+        try:
+            detections = manager.process_frame(session_id, frame, timestamp)
+            result = (detections, manager.sessions[session_id].last_events)
+        except Exception as e:
+            result = ({"error": str(e)}, [])
+        del frame
+        results.send((request_id, worker_id, slot, result))
+
+    # waits for queued screenshots to be written
+    manager.stop()
+    send_metrics()
+    results.close()
+    shm.close()
+
+
+def _resolve(future, result):
+    """Resolve a request with its result (an exception is raised), unless the caller cancelled it"""
+    if not future.set_running_or_notify_cancel():
+        return
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+
+
+class _Worker:
+    def __init__(self, worker_id, context, slot_count, slot_bytes):
+        self.worker_id = worker_id
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_count * slot_bytes)
+        self.tasks = context.Queue()
+        # One result pipe per worker: a worker killed in the middle of a write can only break its own
+        self.results, self.sender = context.Pipe(duplex=False)
+        self.free_slots = deque(range(slot_count))
+        self.dropped_frames = 0
+        self.ready = False
+        self.process = None
+        # exit code once the process is gone (its result pipe was closed)
+        self.exitcode = None
+
+    @property
+    def alive(self):
+        return self.exitcode is None
+
+
+class InferenceWorkerPool:
+    """N inference processes, each with its own YOLO model and face mesh graphs.
+
+    Frames are copied once into a ring of shared memory slots of the session's
+    worker instead of being pickled, only a small task tuple goes through the
+    queue. Results come back on a pipe per worker and resolve the Future that
+    submit() returned. A session always goes to the same worker, so its
+    detector state (timers, calibration) stays in one process.
+
+    When a worker process dies, its result pipe is closed: the futures it
+    still owed are resolved right away (with an error result) and its
+    sessions are refused from then on.
+    """
+
+    def __init__(self, num_workers=2, slots_per_worker=4, max_frame_shape=(1080, 1920, 3),
+                 manager_kwargs=None, start_method=None):
+        """
+        num_workers: number of inference processes
+        slots_per_worker: frames a worker can have in flight, more are dropped
+        max_frame_shape: largest frame (height, width, channels) a slot can hold
+        manager_kwargs: arguments for the SessionManager inside every worker
+        start_method: multiprocessing start method, default "forkserver" with the heavy
+                      modules preloaded where available, "spawn" otherwise
+        """
+        start_method = start_method or _default_start_method()
+        context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Only modules, models are loaded in the workers: a forked torch thread pool would deadlock
+            context.set_forkserver_preload(PRELOAD_MODULES)
+        self.slot_bytes = int(np.prod(max_frame_shape))
+        self.lock = threading.Lock()
+        # request id -> (future, worker id, what the future resolves to if that worker is gone)
+        self.futures = {}
+        self.request_ids = itertools.count()
+
+        self.workers = []
+        for worker_id in range(num_workers):
+            worker = _Worker(worker_id, context, slots_per_worker, self.slot_bytes)
+            worker.process = context.Process(
+                target=_worker_main,
+                args=(worker_id, worker.shm.name, self.slot_bytes, worker.tasks, worker.sender, manager_kwargs or {}),
+                name=f"inference-worker-{worker_id}",
+                daemon=True
+            )
+            worker.process.start()
+            # Only the worker holds the sending end, so the pipe reports EOF as soon as the worker is gone
+            worker.sender.close()
+            self.workers.append(worker)
+
+        self.collector = threading.Thread(target=self._collect_results, name="worker-results", daemon=True)
+        self.collector.start()
+
+    def worker_for(self, session_id):
+        """Sticky worker of a session (stable across processes, unlike hash())"""
+        return self.workers[zlib.crc32(str(session_id).encode()) % len(self.workers)]
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded its models, returns False on timeout or when one died"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(worker.ready for worker in self.workers):
+            if not all(worker.alive for worker in self.workers):
+                return False
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _request(self, worker, failed_result):
+        """New request id and Future on a worker, the caller holds self.lock"""
+        request_id = next(self.request_ids)
+        future = Future()
+        self.futures[request_id] = (future, worker.worker_id, failed_result)
+        return request_id, future
+
+    def open_session(self, session_id, student_id=None):
+        """Open a session on its worker.
+
+        Returns a Future that resolves to None once the session is open, or
+        raises CapacityError when the worker is full or not running.
+        """
+        worker = self.worker_for(session_id)
+        error = CapacityError(f"inference worker {worker.worker_id} is not running")
+        with self.lock:
+            if not worker.alive:
+                future = Future()
+                future.set_exception(error)
+                return future
+            request_id, future = self._request(worker, error)
+        worker.tasks.put(("open", request_id, session_id, student_id))
+        return future
+
+    def submit(self, session_id, frame, timestamp=None):
+        """Send a uint8 frame to the session's worker (opened with open_session()).
+
+        Returns a Future with (detector results, violation events), or None
+        when all slots of that worker are busy (the frame is dropped and counted).
+        """
+        if frame.dtype != np.uint8:
+            raise ValueError("only uint8 frames can be sent to the workers")
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame of {frame.shape} does not fit into a {self.slot_bytes} byte slot")
+        if timestamp is None:
+            timestamp = time.time()
+
+        worker = self.worker_for(session_id)
+        with self.lock:
+            if not worker.alive:
+                future = Future()
+                future.set_result(({"error": f"inference worker {worker.worker_id} is not running"}, []))
+                return future
+            if not worker.free_slots:
+                worker.dropped_frames += 1
+                return None
+            slot = worker.free_slots.popleft()
+            request_id, future = self._request(
+                worker, ({"error": f"inference worker {worker.worker_id} is not running"}, []))
+
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=worker.shm.buf, offset=slot * self.slot_bytes)
+        np.copyto(view, frame)
+        worker.tasks.put(("frame", request_id, session_id, slot, frame.shape, timestamp))
+        return future
+
+    def close_session(self, session_id):
+        """Close a session on its worker, returns a Future with the violation events it ended"""
+        worker = self.worker_for(session_id)
+        with self.lock:
+            if not worker.alive:
+                future = Future()
+                future.set_result([])
+                return future
+            request_id, future = self._request(worker, [])
+        worker.tasks.put(("close", request_id, session_id))
+        return future
+
+    def _collect_results(self):
+        connections = {worker.results: worker for worker in self.workers}
+        # Ends once every worker has exited (see close())
+        while connections:
+            for connection in wait(list(connections)):
+                worker = connections[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    del connections[connection]
+                    self._worker_exited(worker)
+                    continue
+                self._handle(worker, message)
+
+    def _handle(self, worker, message):
+        request_id, _, slot, result = message
+        with self.lock:
+            if request_id == "ready":
+                worker.ready = True
+                return
+            if request_id == "metrics":
+                # Detection timings of the worker, /metrics serves them from this process
+                registry.merge(result)
+                return
+            if slot is not None:
+                worker.free_slots.append(slot)
+            pending = self.futures.pop(request_id, None)
+        if pending is not None:
+            _resolve(pending[0], result)
+
+    def _worker_exited(self, worker):
+        """Resolve the futures of a worker that is gone, nothing else would ever answer them"""
+        worker.process.join(timeout=1)
+        with self.lock:
+            worker.exitcode = worker.process.exitcode if worker.process.exitcode is not None else -1
+            failed = [(request_id, entry) for request_id, entry in self.futures.items()
+                      if entry[1] == worker.worker_id]
+            for request_id, _ in failed:
+                del self.futures[request_id]
+        for _, (future, _, failed_result) in failed:
+            _resolve(future, failed_result)
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        for worker in self.workers:
+            worker.tasks.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        # The workers' pipes are closed now, the collector delivers what is left and stops
+        self.collector.join(timeout=2)
+
+        with self.lock:
+            pending = list(self.futures.values())
+            self.futures.clear()
+        for future, _, failed_result in pending:
+            _resolve(future, failed_result)
+        for worker in self.workers:
+            worker.results.close()
+            worker.shm.close()
+            worker.shm.unlink()